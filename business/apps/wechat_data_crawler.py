@@ -3,35 +3,110 @@
 
 from ctypes import BigEndianStructure
 import pendulum
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from config import config
 
 
+from tools.pacing import Pacer
+from tools.tracing import start_trace, finish_trace
 from business.services.wechat_data_crawler import WechatDataFetcher
-from business.services.wechat_data_process import WechatDataAnalyzer, WechatDataPublisher
+from business.services.wechat_data_process import WechatDataAnalyzer, WechatDataPublisher, WechatDataPipeline
+from business.services.wechat_data_tables import ParquetTableStore
 
 
-def run(begin_date=None, end_date=None):
+def run(begin_date=None, end_date=None, pacing=None, profile=None):
+    """
+    :param pacing: 后台操作的等待模式, human | fast, 默认使用配置WECHAT_PACING_MODE
+    :param profile: 账号配置名称, 使用该账号独立的登录状态文件和下载目录
+    :return: 账号名称
+    """
     # 下载所有数据
     if begin_date is not None:
         begin_date = pendulum.parse(begin_date)
     if end_date is not None:
         end_date = pendulum.parse(end_date)
 
-    crawler = WechatDataFetcher(begin_date, end_date)
-    download_info = crawler.download_all()
-    account_name = download_info["account_name"]
-    traffic_path, article_7d_path, unpub_article_7d_path, article_detail_paths, unpub_article_detail_paths, user_growth_path = download_info["download_paths"]
-
-    # 处理数据
-    processor = WechatDataAnalyzer(
-        account_name, traffic_path, article_7d_path, unpub_article_7d_path, 
-        article_detail_paths, unpub_article_detail_paths, user_growth_path=user_growth_path)
-    processor.process_data()
+    # 记录各阶段耗时, 运行结束时打印汇总表
+    if config.wechat_trace:
+        trace_name = f"wechat_fetch_{profile or 'default'}_{pendulum.now().format('YYYYMMDD_HHmmss')}.jsonl"
+        start_trace(Path(config.root_dir) / 'tmp/traces' / trace_name)
+    try:
+        account_name = _fetch_and_process(begin_date, end_date, pacing, profile)
+    finally:
+        finish_trace()
 
     # 发布数据
     publisher = WechatDataPublisher(account_name)
     publisher.publish()
+    return account_name
+
+
+def _fetch_and_process(begin_date, end_date, pacing, profile):
+    """下载并处理数据, 返回账号名称"""
+    crawler = WechatDataFetcher(begin_date, end_date, Pacer(pacing), profile)
+    if config.wechat_process_mode == 'pipeline':
+        account_name = _download_and_process(crawler)
+    else:
+        download_info = crawler.download_all()
+        account_name = download_info["account_name"]
+        traffic_path, article_7d_path, unpub_article_7d_path, article_detail_paths, unpub_article_detail_paths, user_growth_path = download_info["download_paths"]
+
+        # 处理数据
+        processor = WechatDataAnalyzer(
+            account_name, traffic_path, article_7d_path, unpub_article_7d_path, 
+            article_detail_paths, unpub_article_detail_paths, user_growth_path=user_growth_path)
+        processor.process_data()
+    # 数据处理完成后, 才记录文章的最终数据已经保存
+    crawler.save_article_freshness()
+    return account_name
+
+
+def _download_and_process(crawler):
+    """
+    边下载边处理, 每个文件下载完成后立即交给后台线程解析合并。
+    下载中途失败时, 已下载的文件仍会处理完成后再抛出异常。
+    """
+    pipeline = WechatDataPipeline()
+    pipeline.start()
+    crawler.on_download = pipeline.put
+    try:
+        download_info = crawler.download_all()
+    finally:
+        succeeded = pipeline.close()
+    if not succeeded:
+        raise RuntimeError(f'{len(pipeline.errors)} 个文件处理失败')
+    return download_info["account_name"]
+
+
+def run_accounts(profiles=None, begin_date=None, end_date=None, pacing=None):
+    """
+    多个账号同时下载、处理和发布数据, 每个账号在单独的进程中运行, 使用独立的浏览器、登录状态文件和下载目录。
+    单个账号失败不影响其它账号。
+    :param profiles: 逗号分隔的账号配置名称, 默认使用配置WECHAT_ACCOUNTS
+    """
+    profiles = [profile.strip() for profile in profiles.split(',') if profile.strip()] if profiles else config.wechat_accounts
+    if not profiles:
+        print('没有需要下载的账号, 请通过参数或WECHAT_ACCOUNTS配置账号')
+        return
+    process_num = min(len(profiles), config.wechat_account_process_num)
+    print(f'共 {len(profiles)} 个账号, 同时运行 {process_num} 个')
+
+    failed = []
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=process_num, mp_context=ctx) as executor:
+        futures = {executor.submit(run, begin_date, end_date, pacing, profile): profile for profile in profiles}
+        for future in as_completed(futures):
+            profile = futures[future]
+            try:
+                account_name = future.result()
+                print(f'{profile}: {account_name} 数据处理完成')
+            except BaseException as e:
+                print(f'{profile}: 数据处理失败: {e!r}')
+                failed.append(profile)
+    if failed:
+        print(f"失败的账号: {', '.join(failed)}")
 
 
 def publish_wechat_data(account_name):
@@ -44,5 +119,20 @@ def publish_wechat_data(account_name):
     publisher.publish()
     return True
 
+def compact_wechat_data(account_name):
+    """
+    整理账号的Parquet分区数据: 合并CSV中新增的记录, 合并分区内的文件, 去重并重新排序, 最后将分区表导出为CSV
+    :param account_name: 账号名称
+    """
+    data_dir = Path(config.root_dir) / 'datas/wechat_operation_data' / account_name
+    if not data_dir.exists():
+        print(f'账号 {account_name} 没有本地数据')
+        return False
+    result = ParquetTableStore(data_dir).compact()
+    for table_name, (partitions, rows) in result.items():
+        print(f'{table_name}: {partitions} 个分区, {rows} 行')
+    return True
+
+
 if __name__ == '__main__':
     run()
\ No newline at end of file
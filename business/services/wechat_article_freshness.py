@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import pendulum
+from tools.locker import Locker
+
+
+class ArticleFreshnessIndex:
+    """
+    文章详情数据的新鲜度索引, 记录每篇文章的发表日期和最后一次成功下载的日期。
+    单篇文章发表30日后详情数据不再更新, 如果最后一次下载发生在此之后, 说明本地已经保存了最终数据,
+    后续运行不需要再下载该文章。
+
+    索引保存在tmp/locks/wechat_article_freshness.lock中, 结构为:
+        {账号名称: {文章键: {title, publish_date, first_seen, last_fetch}}}
+    文章键取自详情链接中的msgid, 没有msgid时使用完整链接。
+    列表中读不到发表日期时, 使用第一次在列表中看到该文章的日期, 实际发表日期不会晚于该日期, 判断结果偏保守。
+
+    下载成功后调用mark_fetched记录, 数据处理完成后再调用save写入文件,
+    避免数据处理失败时误认为最终数据已经保存。
+    """
+    FINAL_DAYS = 30
+    lock_file_name = 'wechat_article_freshness.lock'
+    # 多个账号同时运行时共用索引文件, 等待其它进程释放锁
+    lock_timeout = 30
+
+    def __init__(self, account_name):
+        self.account_name = account_name
+        with Locker(self.lock_file_name, self.lock_timeout) as lock_file:
+            self.entries = lock_file.get().get(account_name, {})
+        self.updates = {}
+
+    @staticmethod
+    def article_key(detail_url):
+        if not detail_url:
+            return None
+        match = re.search(r'[?&]msgid=([\w-]+)', detail_url)
+        return match.group(1) if match else detail_url
+
+    @staticmethod
+    def parse_publish_date(text):
+        """从文章列表行的文字中解析发表日期"""
+        match = re.search(r'(\d{4})[-年/](\d{1,2})[-月/](\d{1,2})', text or '')
+        if not match:
+            return None
+        return pendulum.date(*map(int, match.groups())).isoformat()
+
+    def _entry(self, key):
+        if key not in self.updates:
+            self.updates[key] = dict(self.entries.get(key, {}))
+        return self.updates[key]
+
+    def observe(self, key, publish_date=None):
+        """记录在文章列表中看到的文章"""
+        if key is None:
+            return
+        entry = self._entry(key)
+        entry.setdefault('first_seen', pendulum.today().to_date_string())
+        if publish_date:
+            entry['publish_date'] = publish_date
+
+    def is_final(self, key):
+        """最后一次成功下载晚于发表日期30日, 说明已经保存了最终数据"""
+        entry = self.updates.get(key) or self.entries.get(key)
+        if not entry or not entry.get('last_fetch'):
+            return False
+        publish_date = entry.get('publish_date') or entry.get('first_seen')
+        if not publish_date:
+            return False
+        final_date = pendulum.parse(publish_date).add(days=self.FINAL_DAYS)
+        return pendulum.parse(entry['last_fetch']) > final_date
+
+    def mark_fetched(self, key, title):
+        if key is None:
+            return
+        entry = self._entry(key)
+        entry['title'] = title
+        entry['last_fetch'] = pendulum.today().to_date_string()
+
+    def save(self):
+        if not self.updates:
+            return
+        with Locker(self.lock_file_name, self.lock_timeout) as lock_file:
+            data = lock_file.get()
+            account_entries = data.setdefault(self.account_name, {})
+            account_entries.update(self.updates)
+            lock_file.set(data)
+        self.entries.update(self.updates)
+        self.updates = {}
@@ -2,137 +2,530 @@
 # -*- coding: utf-8 -*-
 
 import asyncio
-from playwright.async_api import async_playwright
 import os
 import re
+import math
+import json
+import queue
 import random
-import pandas as pd
+import threading
+import multiprocessing
 from config import config
+from tools.browser_pool import BrowserPool
+from tools.crawl_manifest import CrawlManifest, SharedArticleClaims, article_keys
+from tools.wechat_url import normalize_url
+from tools.request_router import RequestRouter
+from tools.asset_cache import AssetCache
+from tools.url_reader import iter_urls
+from tools.concurrency import AdaptiveLimiter, HostRateLimiter
+from tools.article_export import OUTPUT_FORMATS, render_article
 import tqdm
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
 """
-    此文件的主要功能是爬取微信公众号文章，并将文章内容保存为PDF文件。
+    此文件的主要功能是爬取微信公众号文章，并将文章内容保存为PDF文件, 也可以导出为HTML、Markdown或纯文本。
     核心意图是从指定的Excel文件中读取文章链接，对这些链接对应的文章进行信息提取和保存操作。
-    Excel文件：datas/wechat_urls.xlsx
-    保存目录：datas/wechat_files/账号/日期_文章标题.pdf
+    Excel文件：datas/wechat_urls.xlsx, 也支持csv和jsonl格式的链接文件
+    保存目录：datas/wechat_files/账号/日期_文章标题.pdf(或.html/.md/.txt)
+    结果文件：datas/wechat_files/crawl_results.jsonl, 每处理完一个链接追加一行
 """
 
-async def crawl_wechat_article(urls):
+# 将data-src写入src, 并取消懒加载, 最后滚动到底部触发依赖滚动事件的组件
+FORCE_LAZY_IMAGES_JS = """
+() => {
+    document.querySelectorAll('img[data-src]').forEach(img => {
+        img.loading = 'eager';
+        const src = img.getAttribute('data-src');
+        if (src && img.getAttribute('src') !== src) {
+            img.setAttribute('src', src);
+        }
+    });
+    window.scrollTo(0, document.body.scrollHeight);
+}
+"""
+
+# 正文中所有图片都已完成加载(成功或失败)
+IMAGES_COMPLETE_JS = """
+() => Array.from(document.querySelectorAll('#js_content img')).every(img => img.complete)
+"""
+
+# 文章的规范链接, 短链接打开后可以从og:url中获得带__biz/mid/idx的长链接
+CANONICAL_URL_JS = """
+() => {
+    const meta = document.querySelector('meta[property="og:url"]');
+    return meta && meta.content ? meta.content : location.href;
+}
+"""
+
+# 微信验证页面的提示文字
+VERIFICATION_KEYWORDS = ['环境异常', '完成验证后即可继续访问', '访问过于频繁']
+
+
+class VerificationError(Exception):
+    """访问文章时出现了验证页面"""
+
+
+async def check_verification(page):
+    """检查是否跳转到验证页面, 是则抛出VerificationError"""
+    if 'captcha' in page.url:
+        raise VerificationError(f'出现验证页面: {page.url}')
+    text = await page.evaluate("() => document.body ? document.body.innerText.slice(0, 500) : ''")
+    if any(keyword in text for keyword in VERIFICATION_KEYWORDS):
+        raise VerificationError(f'出现验证页面: {page.url}')
+
+
+async def simulate_human(page):
+    """模拟人类操作: 随机等待、滚动和点击"""
+    await asyncio.sleep(random.uniform(1, 2))
+    # 模拟滚动
+    await page.evaluate('window.scrollBy(0, window.innerHeight/2);')
+    await asyncio.sleep(random.uniform(1, 2))
+    # 模拟点击
+    try:
+        await page.click('body', force=True)
+    except Exception:
+        pass
+
+
+async def load_images_by_scroll(page):
+    """缓慢滚动页面到最后, 触发懒加载图片"""
+    scroll_height = await page.evaluate('document.body.scrollHeight')
+    for i in range(0, scroll_height, 100):
+        await page.evaluate(f'window.scrollTo(0, {i});')
+        await asyncio.sleep(random.uniform(0.1, 0.3))
+
+    # 等待同时满足img标签且class包含rich_pages和wxw-img的元素加载完成
+    await page.wait_for_selector('img.rich_pages.wxw-img')
+
+
+async def load_images_fast(page, timeout=None):
+    """
+    直接触发懒加载图片, 不再逐步滚动。
+    微信文章图片的真实地址在data-src中, 将其写入src后, 等待所有图片complete, 再等待网络空闲。
+    超时不视为失败, 已加载的内容照常保存。
+    """
+    timeout = timeout or config.crawler_image_timeout
+    await page.evaluate(FORCE_LAZY_IMAGES_JS)
+    try:
+        await page.wait_for_function(IMAGES_COMPLETE_JS, timeout=timeout)
+    except PlaywrightTimeoutError:
+        tqdm.tqdm.write(f'等待图片加载超时: {page.url}')
+    try:
+        await page.wait_for_load_state('networkidle', timeout=timeout)
+    except PlaywrightTimeoutError:
+        pass
+    await page.evaluate('window.scrollTo(0, 0);')
+
+
+class ResultSink:
+    """
+    汇总单个链接的处理结果: 写入爬取记录, 追加到JSONL结果文件, 更新进度条。
+    未指定output_path时, 成功的文章信息保存在results中。
+    """
+    def __init__(self, manifest=None, output_path=None, total=None):
+        self.manifest = manifest
+        self.results = []
+        self.success_count = 0
+        self.output_file = None
+        if output_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            self.output_file = open(output_path, 'a', encoding='utf-8')
+        self.progress_bar = tqdm.tqdm(total=total, desc='Processing URLs', unit='url')
+        # 每个进程当前的并发上限, 进度条显示总和
+        self.worker_limits = {}
+
+    def emit(self, record):
+        if record['status'] == 'done':
+            self.success_count += 1
+            if self.manifest is not None:
+                self.manifest.mark_done(record['url'], record['info']['path'], record['info'])
+            if self.output_file is None:
+                self.results.append(record['info'])
+        elif self.manifest is not None:
+            self.manifest.mark_failed(record['url'], record['error'])
+        if self.output_file is not None:
+            self.output_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.output_file.flush()
+        if 'concurrency' in record:
+            self.worker_limits[record.get('worker')] = record['concurrency']
+            self.progress_bar.set_postfix(limit=sum(self.worker_limits.values()), refresh=False)
+        self.progress_bar.update(1)
+
+    def close(self):
+        self.progress_bar.close()
+        if self.output_file is not None:
+            self.output_file.close()
+            self.output_file = None
+
+
+async def crawl_wechat_article(urls, manifest=None, output_path=None, on_result=None, output_format=None,
+                               shared_claims=None, max_parallel_num=None, host_limiter=None):
     """
     爬取微信公众号文章
-    :param url: 文章链接
-    :return: 文章信息字典
+    读取链接和处理链接是生产者/消费者模式: 链接逐个放入有界队列, worker从队列中取链接处理,
+    因此urls可以是任意长度的迭代器(也可以是异步迭代器), 内存占用不随链接数量增长。
+    :param urls: 文章链接, 列表或迭代器
+    :param manifest: 爬取记录, 每个链接完成或失败后立即写入, 同时用于跳过已保存过的同一篇文章
+    :param output_path: JSONL结果文件, 每个链接处理完后立即追加一行, 包括失败的链接
+    :param on_result: 自定义结果回调, 指定后不再写入manifest和output_path, 用于多进程模式将结果交给主进程
+    :param output_format: 输出格式 pdf | html | markdown | text, 默认为CRAWLER_OUTPUT_FORMAT
+    :param shared_claims: 多进程模式下各子进程共用的SharedArticleClaims, 用于跨进程发现同一篇文章
+    :param max_parallel_num: 并发上限, 默认为CRAWLER_MAX_PARALLEL_NUM, 多进程模式下为每个子进程分到的上限
+    :param host_limiter: 域名限速, 多进程模式下为各子进程共用的HostRateLimiter
+    :return: 未指定output_path时, 返回成功爬取的文章信息字典列表; 否则返回成功数量。单个链接失败不影响其它链接
     """
-    semaphore = asyncio.Semaphore(config.parallel_num)
-    progress_bar = tqdm.tqdm(total=len(urls), desc='Processing URLs', unit='url')
-    async def process_url(url):
-        async with semaphore:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(headless=False)
-                headers = {
-                    'User-Agent': random.choice([
-                        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
-                        'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:54.0) Gecko/20100101 Firefox/54.0',
-                        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_12_6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/61.0.3163.100 Safari/537.36'
-                    ])
-                }
-                page = await browser.new_page(extra_http_headers=headers)
-                await page.goto(url, wait_until='load')
-                await asyncio.sleep(random.uniform(1, 2))
-                # 模拟滚动
-                await page.evaluate('window.scrollBy(0, window.innerHeight/2);')
-                await asyncio.sleep(random.uniform(1, 2))
-                # 模拟点击
-                try:
-                    await page.click('body', force=True)
-                except Exception:
-                    pass
-                await page.wait_for_selector('h1#activity-name')
-                # 根据id获取文章标题
-                title = await page.text_content('h1#activity-name')
-                if not title:
-                    raise ValueError("未找到文章标题")
-                title = title.strip()
-                    
-                await page.wait_for_selector('#js_wx_follow_nickname')
-                # 获取账号，从第二行开始查找
-                account = (await page.evaluate("() => document.querySelector('#js_name').textContent")).strip()
-                await page.wait_for_selector('#publish_time')
-                # 获取发表日期
-                # 根据id获取发布时间
-                date_text = await page.evaluate("() => document.querySelector('#publish_time')?.textContent")
-                if not date_text:
-                    raise ValueError("未找到发表日期")
-                date_match = re.search(r'\d{4}年\d{2}月\d{2}日', date_text)
-                if date_match:
-                    date = date_match.group(0)
-                else:
-                    raise ValueError("日期格式不正确")
-
-                # 组织信息到字典中
-                article_info = {
-                    'title': title,
-                    'account': account,
-                    'date': date
-                }
-
-                # 检查datas目录是否存在，若不存在则抛出异常
-                data_dir = os.path.join(config.root_dir, 'datas')
-                if not os.path.exists(data_dir):
-                    raise FileNotFoundError(f'目录 {data_dir} 不存在')
-
-                # 创建保存PDF的目录
-                pdf_dir = os.path.join(data_dir, f'wechat_files/{account}/')
-                os.makedirs(pdf_dir, exist_ok=True)
-
-                # 生成PDF文件名
-                pdf_filename = f'{date}_{title}.pdf'
-                pdf_path = os.path.join(pdf_dir, pdf_filename)
-
-                # 缓慢滚动页面到最后
-                scroll_height = await page.evaluate('document.body.scrollHeight')
-                for i in range(0, scroll_height, 100):
-                    await page.evaluate(f'window.scrollTo(0, {i});')
-                    await asyncio.sleep(random.uniform(0.1, 0.3))
-
-                # 等待同时满足img标签且class包含rich_pages和wxw-img的元素加载完成
-                await page.wait_for_selector('img.rich_pages.wxw-img')
-
-                # 保存文章为PDF
-                await page.pdf(path=pdf_path)
-
-                await browser.close()
-                progress_bar.update(1)
+    output_format = output_format or config.crawler_output_format
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f'不支持的输出格式: {output_format}')
+    sink = None
+    if on_result is None:
+        total = len(urls) if hasattr(urls, '__len__') else None
+        sink = ResultSink(manifest, output_path, total)
+        on_result = sink.emit
+
+    async def process_url(pool, url, report):
+        record = {'url': url, 'status': 'done', 'error': None, 'info': None}
+        try:
+            record['info'] = await crawl_url(pool, url)
+            report.success()
+        except (VerificationError, PlaywrightTimeoutError) as e:
+            # 超时和验证页面说明已经被限流, 需要降低并发
+            report.throttled()
+            record.update(status='failed', error=f'{type(e).__name__}: {e}')
+        except Exception as e:
+            report.failure()
+            record.update(status='failed', error=f'{type(e).__name__}: {e}')
+        if record['status'] == 'failed':
+            tqdm.tqdm.write(f"爬取失败 {url}: {record['error']}")
+        record['concurrency'] = limiter.limit
+        record['worker'] = os.getpid()
+        on_result(record)
+
+    # 本次运行中已保存或正在保存的文章, 去重键 -> Future, 结果为{'url', 'path'}, 保存失败时为None
+    claimed_articles = {}
+
+    async def claim_article(article_info):
+        """
+        检查文章是否已经保存过, 没有则占用该文章的去重键。
+        其它链接正在保存同一篇文章时, 等待其完成; 对方保存失败时由当前链接保存。
+        :return: 已保存文章的{'url', 'path'}, 需要当前链接保存时返回None
+        """
+        while True:
+            keys = article_keys(article_info)
+            pending = next((claimed_articles[key] for key in keys if key in claimed_articles), None)
+            if pending is None:
+                break
+            original = await asyncio.shield(pending)
+            if original is not None:
+                return original
+        if manifest is not None:
+            record = manifest.find_article(article_info)
+            if record is not None:
+                return {'url': record['url'], 'path': record['path']}
+        future = asyncio.get_running_loop().create_future()
+        for key in keys:
+            claimed_articles[key] = future
+        if shared_claims is not None:
+            # 其它子进程正在保存同一篇文章时等待其完成, 同一进程中的其它链接等待当前链接的结果
+            try:
+                while True:
+                    holder = shared_claims.try_claim(keys)
+                    if holder is None:
+                        break
+                    if isinstance(holder, dict):
+                        future.set_result(holder)
+                        return holder
+                    await asyncio.sleep(0.5)
+            except BaseException:
+                release_article(article_info, None)
+                raise
+        return None
+
+    def release_article(article_info, original):
+        """文章保存完成(original为保存结果)或失败(original为None)"""
+        future = None
+        keys = article_keys(article_info)
+        for key in keys:
+            future = claimed_articles.get(key)
+            if original is None:
+                claimed_articles.pop(key, None)
+        if shared_claims is not None:
+            shared_claims.release(keys, original)
+        if future is not None and not future.done():
+            future.set_result(original)
+
+    async def crawl_url(pool, url):
+        # 浏览器池大小即并发数, 租用到页面才开始处理
+        async with pool.lease() as page:
+            # 清零上一个链接的拦截统计
+            router.pop_stats(page)
+            await host_limiter.acquire(url)
+            # 导出文本时不需要等待图片等资源加载
+            await page.goto(url, wait_until='load' if output_format == 'pdf' else 'domcontentloaded')
+            await check_verification(page)
+            if config.crawler_load_mode == 'scroll':
+                await simulate_human(page)
+            await page.wait_for_selector('h1#activity-name')
+            # 根据id获取文章标题
+            title = await page.text_content('h1#activity-name')
+            if not title:
+                raise ValueError("未找到文章标题")
+            title = title.strip()
+                
+            await page.wait_for_selector('#js_wx_follow_nickname')
+            # 获取账号，从第二行开始查找
+            account = (await page.evaluate("() => document.querySelector('#js_name').textContent")).strip()
+            await page.wait_for_selector('#publish_time')
+            # 获取发表日期
+            # 根据id获取发布时间
+            date_text = await page.evaluate("() => document.querySelector('#publish_time')?.textContent")
+            if not date_text:
+                raise ValueError("未找到发表日期")
+            date_match = re.search(r'\d{4}年\d{2}月\d{2}日', date_text)
+            if date_match:
+                date = date_match.group(0)
+            else:
+                raise ValueError("日期格式不正确")
+
+            # 组织信息到字典中
+            article_info = {
+                'title': title,
+                'account': account,
+                'date': date,
+                'canonical_key': normalize_url(await page.evaluate(CANONICAL_URL_JS)),
+                'path': None
+            }
+
+            # 同一篇文章已经保存过(例如短链接和长链接), 不再重复保存
+            duplicate = await claim_article(article_info)
+            if duplicate is not None:
+                article_info['path'] = duplicate['path']
+                article_info['duplicate_of'] = duplicate['url']
+                router.pop_stats(page)
+                tqdm.tqdm.write(f"{url} 与 {duplicate['url']} 是同一篇文章, 跳过")
                 return article_info
-    tasks = [process_url(url) for url in urls]
-    results = await asyncio.gather(*tasks)
-    progress_bar.close()
-    return results
+            try:
+                await save_article(page, article_info)
+            except BaseException:
+                release_article(article_info, None)
+                raise
+            release_article(article_info, {'url': url, 'path': article_info['path']})
+
+            # 记录拦截的请求数量和估算节省的流量
+            route_stats = router.pop_stats(page)
+            article_info['blocked_requests'] = route_stats['blocked_requests']
+            article_info['saved_bytes'] = route_stats['saved_bytes']
+            tqdm.tqdm.write(
+                f"{url} 拦截请求 {route_stats['blocked_requests']} 个, "
+                f"约节省 {route_stats['saved_bytes'] / 1024:.0f} KB {route_stats['blocked_types']}"
+            )
+            return article_info
+
+    async def save_article(page, article_info):
+        """保存文章文件, 文件路径写入article_info['path']"""
+        title, account, date = article_info['title'], article_info['account'], article_info['date']
+
+        # 检查datas目录是否存在，若不存在则抛出异常
+        data_dir = os.path.join(config.root_dir, 'datas')
+        if not os.path.exists(data_dir):
+            raise FileNotFoundError(f'目录 {data_dir} 不存在')
+
+        # 创建保存文件的目录
+        file_dir = os.path.join(data_dir, f'wechat_files/{account}/')
+        os.makedirs(file_dir, exist_ok=True)
+
+        # 生成文件名
+        file_name = f'{date}_{title}.{OUTPUT_FORMATS[output_format]}'
+        file_path = os.path.join(file_dir, file_name)
+        article_info['path'] = file_path
+
+        if output_format == 'pdf':
+            # 加载文章中的懒加载图片
+            if config.crawler_load_mode == 'scroll':
+                await load_images_by_scroll(page)
+            else:
+                await load_images_fast(page)
+
+            # 保存文章为PDF
+            await page.pdf(path=file_path)
+        else:
+            # 直接导出正文, 不需要滚动和渲染
+            content_html = await page.inner_html('#js_content')
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(render_article(output_format, article_info, content_html))
+
+    # 导出文本时图片和样式也不需要加载
+    block_resource_types = list(config.crawler_block_resource_types)
+    if output_format != 'pdf':
+        block_resource_types += ['image', 'stylesheet']
+    router = RequestRouter(block_resource_types=block_resource_types)
+    asset_cache = AssetCache().load() if config.crawler_asset_cache_mb > 0 else None
+
+    async def setup_page(page):
+        # 后安装的路由先执行: 先拦截无用请求, 放行的请求再走资源缓存
+        if asset_cache is not None:
+            await asset_cache.attach(page)
+        await router.attach(page)
+
+    # 并发数由limiter动态调整, worker数量和浏览器池大小取并发上限
+    limiter = AdaptiveLimiter(max_limit=max_parallel_num)
+    host_limiter = host_limiter or HostRateLimiter()
+    worker_num = limiter.max_limit
+    queue = asyncio.Queue(maxsize=worker_num * 2)
+
+    async def produce():
+        try:
+            if hasattr(urls, '__aiter__'):
+                async for url in urls:
+                    await queue.put(url)
+            else:
+                for url in urls:
+                    await queue.put(url)
+        finally:
+            # 每个worker一个结束标记
+            for _ in range(worker_num):
+                await queue.put(None)
+
+    async def work(pool):
+        while True:
+            url = await queue.get()
+            if url is None:
+                return
+            async with limiter.slot() as report:
+                await process_url(pool, url, report)
+
+    try:
+        async with BrowserPool(size=worker_num, on_new_page=setup_page, active_limit=lambda: limiter.limit) as pool:
+            producer = asyncio.create_task(produce())
+            await asyncio.gather(*[work(pool) for _ in range(worker_num)])
+            # 读取链接出错时在这里抛出
+            await producer
+    finally:
+        if sink is not None:
+            sink.close()
+        if asset_cache is not None:
+            asset_cache.save()
+            print(asset_cache.summary())
+    if sink is None:
+        return None
+    return sink.results if output_path is None else sink.success_count
 
 
-def run():
+def _shard_worker(task_queue, result_queue, output_format, manifest_path, shared_claims, max_parallel_num,
+                  host_limiter):
+    """
+    多进程模式下的子进程入口, 每个子进程有独立的事件循环和浏览器池。
+    从task_queue读取链接, 结果写入result_queue, 结束时写入None。
+    爬取记录只读, 用于跳过之前已保存过的同一篇文章, 由主进程负责写入。
+    本次运行中其它子进程保存的文章通过shared_claims发现, 域名限速由host_limiter在各子进程间共用。
+    """
+    manifest = CrawlManifest(manifest_path).load(compact=False) if manifest_path else None
+
+    async def iter_tasks():
+        loop = asyncio.get_running_loop()
+        while True:
+            url = await loop.run_in_executor(None, task_queue.get)
+            if url is None:
+                return
+            yield url
+
+    try:
+        asyncio.run(crawl_wechat_article(
+            iter_tasks(), manifest, on_result=result_queue.put, output_format=output_format,
+            shared_claims=shared_claims, max_parallel_num=max_parallel_num, host_limiter=host_limiter))
+    finally:
+        result_queue.put(None)
+
+
+def crawl_wechat_article_sharded(urls, process_num, manifest=None, output_path=None, output_format=None):
+    """
+    多进程爬取微信公众号文章, 单个事件循环驱动大量页面时会占满一个CPU核心。
+    主进程逐个读取链接放入进程间队列, process_num个子进程从队列中领取链接,
+    子进程的结果统一交回主进程, 由主进程写入爬取记录、结果文件, 并更新同一个进度条。
+    文章的去重键保存在主进程启动的Manager中, 同一篇文章的不同链接分到不同子进程时只保存一次。
+    并发上限平分给各子进程, 域名令牌桶同样保存在Manager中, 总并发和请求速率与单进程模式一致。
+    :return: 同crawl_wechat_article
+    """
+    ctx = multiprocessing.get_context('spawn')
+    manager = ctx.Manager()
+    shared_claims = SharedArticleClaims(manager)
+    host_limiter = HostRateLimiter(manager=manager)
+    max_parallel_num = math.ceil(config.crawler_max_parallel_num / process_num)
+    # 每个子进程的worker数量为分到的并发上限, 队列大小与单进程模式一致
+    task_queue = ctx.Queue(maxsize=process_num * max_parallel_num * 2)
+    result_queue = ctx.Queue()
+    manifest_path = str(manifest.path) if manifest is not None else None
+    workers = [ctx.Process(target=_shard_worker, args=(task_queue, result_queue, output_format, manifest_path,
+                                                       shared_claims, max_parallel_num, host_limiter),
+                           daemon=True)
+               for _ in range(process_num)]
+    for worker in workers:
+        worker.start()
+
+    def feed():
+        for url in urls:
+            task_queue.put(url)
+        for _ in workers:
+            task_queue.put(None)
+    # 子进程异常退出时put可能一直阻塞, 使用守护线程不影响主进程退出
+    threading.Thread(target=feed, daemon=True).start()
+
+    total = len(urls) if hasattr(urls, '__len__') else None
+    sink = ResultSink(manifest, output_path, total)
+    finished = 0
+    try:
+        while finished < len(workers):
+            try:
+                record = result_queue.get(timeout=1)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    print('爬取子进程异常退出')
+                    break
+                continue
+            if record is None:
+                finished += 1
+                continue
+            sink.emit(record)
+    finally:
+        sink.close()
+        for worker in workers:
+            worker.join(timeout=5)
+        manager.shutdown()
+    return sink.results if output_path is None else sink.success_count
+
+
+def run(input_path=None, output_path=None, output_format=None):
     """
     爬取微信公众号文章
-    :return: 文章信息字典
+    :param input_path: 链接文件, 支持xlsx/csv/jsonl, 默认为datas/wechat_urls.xlsx
+    :param output_path: JSONL结果文件, 默认为datas/wechat_files/crawl_results.jsonl
+    :param output_format: 输出格式 pdf | html | markdown | text, 默认为CRAWLER_OUTPUT_FORMAT
+    :return: 成功爬取的文章数量
     """
-    # 读取Excel文件中的链接
     data_dir = os.path.join(config.root_dir, 'datas')
-    excel_file_path = os.path.join(data_dir, 'wechat_urls.xlsx')
+    input_path = input_path or os.path.join(data_dir, 'wechat_urls.xlsx')
+    output_path = output_path or os.path.join(data_dir, 'wechat_files', 'crawl_results.jsonl')
     try:
-        # 直接读取Excel文件
-        df = pd.read_excel(excel_file_path)
-        # 提取文章链接
-        urls = df['文章链接'].tolist()
+        # 流式读取文件中的链接
+        urls = iter_urls(input_path, column='文章链接')
     except FileNotFoundError:
-        print(f'未找到文件 {excel_file_path}')
+        print(f'未找到文件 {input_path}')
         urls = []
     except KeyError:
-        print('Excel文件中未找到指定的链接列名')
+        print('链接文件中未找到指定的链接列名')
         urls = []
 
-    result = asyncio.run(crawl_wechat_article(urls))
-    return result
+    # 跳过已完成的链接, 只爬取新增和失败的链接
+    manifest = CrawlManifest(os.path.join(data_dir, 'wechat_files', 'crawl_manifest.jsonl')).load()
+    pending_urls = manifest.iter_pending(urls)
 
+    if config.crawler_process_num > 1:
+        result = crawl_wechat_article_sharded(
+            pending_urls, config.crawler_process_num, manifest, output_path, output_format)
+    else:
+        result = asyncio.run(crawl_wechat_article(pending_urls, manifest, output_path, output_format=output_format))
+    print(f'爬取完成, 成功 {result} 篇, 结果已写入 {output_path}')
+    return result
 
 
 if __name__ == '__main__':
@@ -31,6 +31,7 @@
                 年龄分布: 年龄|人数|占比
                 地域分布: 省份/直辖市|人数|占比
             时效: 数据会随着时间的推移而变化, 单篇文章发表30日后, 就不会更新了。注意: 数据趋势明细已有的日期数据不会更新, 只会新增日期数据。             
+                  发表30日后已经下载过的文章记录在文章新鲜度索引中, 之后的运行不再下载。
             操作: 在“已通知内容“页面, 点击”详情“, 进入到文章详情页面, 点击”下载数据明细“, 该数据是处理特定文章的运营数据。
             字段说明:
                 送达人数: 内容群发时，送达的人数 
@@ -71,31 +72,58 @@
             2) 公众号消息: 公众号回话、公众号列表中的非看一看区域内容
 """
 
-import os
 from numpy import arange
 import pandas as pd
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 import random
 from pathlib import Path
 from config import config
 from tools.locker import Locker
 import pendulum
 import re
-import time
+import json
 import shutil
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from tools import wechat_date_picker
+from tools.pacing import Pacer
+from tools.tracing import span, traced, current_span
+from business.services.wechat_export_client import WechatExportClient, ExportError
+from business.services.wechat_article_freshness import ArticleFreshnessIndex
+from business.services.wechat_session import check_session, warn_session_expiry
 
 
 class WechatDataFetcher:
 
-    def __init__(self, begin_date=None, end_date=None):
+    # 多个账号同时运行时共用下载记录文件, 等待其它进程释放锁
+    lock_timeout = 30
+
+    def __init__(self, begin_date=None, end_date=None, pacer=None, profile=None):
+        """
+        :param profile: 账号配置名称, 多账号运行时每个账号使用独立的登录状态文件和下载目录:
+            tmp/session/wechat/{profile}.json, tmp/data/wechat_accounts/{profile}
+            不传时使用默认的登录状态文件和下载目录
+        """
+        self.playwright = None
         self.browser = None
         self.page = None
+        self.session_saved_at = None
         self.begin_date = begin_date
         self.end_date = end_date
-        self.tmp_data_dir = Path(config.root_dir) / 'tmp/data/wechat'
+        self.profile = profile
+        if profile is None:
+            self.tmp_data_dir = Path(config.root_dir) / 'tmp/data/wechat'
+            self.session_path = Path(config.root_dir) / 'tmp/session/wechat/wechat_session.json'
+        else:
+            self.tmp_data_dir = Path(config.root_dir) / 'tmp/data/wechat_accounts' / profile
+            self.session_path = Path(config.root_dir) / f'tmp/session/wechat/{profile}.json'
         self.account_name = None
         self.lock_file_name = "wechat_operation_data.lock"
+        self.article_freshness = None
+        self.pacer = pacer or Pacer()
+        # 文件下载完成的回调, 参数为(account_name, kind, paths), 用于边下载边处理
+        self.on_download = None
 
     def prepare(self):
         """
@@ -110,7 +138,7 @@ class WechatDataFetcher:
 
         # 确保self.tmp_data_dir存在
         if not self.tmp_data_dir.exists():
-            self.tmp_data_dir.mkdir(parents=True)
+            self.tmp_data_dir.mkdir(parents=True, exist_ok=True)
         # 清空self.tmp_data_dir下所有文件
         for item in self.tmp_data_dir.iterdir():
             if item.is_file():
@@ -118,11 +146,19 @@ class WechatDataFetcher:
             elif item.is_dir():
                 shutil.rmtree(item)
 
-    def login(self, remember=True):               
-        session_dir = Path(config.root_dir) / 'tmp/session/wechat/'
+    @traced()
+    def login(self, remember=True):
+        """
+        登录公众号后台。
+        remember为True时使用持久化的浏览器上下文(tmp/session/wechat/{登录状态文件名}_profile), 启动浏览器前先用保存的
+        登录状态直接请求后台首页检查是否有效: 有效时把保存的cookie加入浏览器上下文, 直接打开带token的后台首页, 不需要扫码,
+        并按配置使用无头模式; 无效或未能进入后台首页时以有界面模式打开登录页等待扫码。
+        登录后保存storage state, 并提示即将过期的登录状态。
+        """
+        session_dir = self.session_path.parent
         if not session_dir.exists():
-            session_dir.mkdir(parents=True)
-        session_path = session_dir / 'wechat_session.json'
+            session_dir.mkdir(parents=True, exist_ok=True)
+        session_path = self.session_path
 
         # 定义通用的浏览器配置和headers
         user_agents = [
@@ -130,34 +166,92 @@ class WechatDataFetcher:
             'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:54.0) Gecko/20100101 Firefox/54.0',
             'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_12_6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/61.0.3163.100 Safari/537.36'
         ]
+        user_agent = random.choice(user_agents)
+        headers = {'User-Agent': user_agent}
+        base_url = config.wechat_mp_base_url.rstrip('/')
 
-        p = sync_playwright().start()
-        self.browser = p.chromium.launch(headless=False, downloads_path=self.tmp_data_dir)
-        headers = {'User-Agent': random.choice(user_agents)}
-        
+        self.playwright = sync_playwright().start()
         # 根据是否记住登录状态创建不同的上下文
-        if remember and os.path.exists(session_path):
-            context = self.browser.new_context(storage_state=session_path, extra_http_headers=headers)
+        if remember:
+            profile_dir = session_dir / f'{session_path.stem}_profile'
+            token = check_session(self.playwright, session_path, base_url, user_agent)
+            headless = token is not None and config.wechat_warm_headless
+            self._launch_persistent_context(profile_dir, headless, headers)
+            if token is not None:
+                # 持久化上下文不支持storage_state参数, 新建的profile目录中没有登录cookie, 需要手动加入
+                self.browser.add_cookies(json.loads(session_path.read_text(encoding='utf-8')).get('cookies', []))
+                print('登录状态有效, 跳过扫码登录')
+                if not self._open_home(base_url, token):
+                    print('未能进入后台首页, 需要重新扫码登录')
+                    token = None
+                    if headless:
+                        # 无头模式无法扫码, 重新以有界面模式启动
+                        self.browser.close()
+                        self._launch_persistent_context(profile_dir, False, headers)
         else:
+            token = None
+            self.browser = self.playwright.chromium.launch(headless=False, downloads_path=self.tmp_data_dir)
             context = self.browser.new_context(extra_http_headers=headers)
-            
-        self.page = context.new_page()
-        self.page.goto('https://mp.weixin.qq.com/')
-        print('请扫码登录微信公众号后台...')
-        self.page.wait_for_url('https://mp.weixin.qq.com/*')
-        
-        # 登录成功后保存session
-        if remember:
-            self.page.context.storage_state(path=session_path)
+            self.page = context.new_page()
+
+        if token is None:
+            self.page.goto(f'{base_url}/')
+            print('请扫码登录微信公众号后台...')
+            self.page.wait_for_url(f'{base_url}/*')
+            # 等待导航栏加载完成
+            self.page.wait_for_selector('#js_index_menu')
 
-        # 等待导航栏加载完成
-        self.page.wait_for_selector('#js_index_menu')
+        # 登录成功后保存session, 需要在进入后台首页后保存, HTTP导出依赖其中的登录cookie
+        if remember:
+            self.refresh_session(force=True)
             
         # 模拟人类操作行为
-        time.sleep(random.uniform(0.5, 3))
-        scroll_distance = random.randint(100, 500)
-        self.page.evaluate(f'window.scrollBy(0, {scroll_distance});')
-                
+        self.pacer.pause(0.5, 3, self.page)
+        self.pacer.scroll(self.page)
+
+    def _launch_persistent_context(self, profile_dir, headless, headers):
+        context = self.playwright.chromium.launch_persistent_context(
+            profile_dir, headless=headless, accept_downloads=True,
+            downloads_path=self.tmp_data_dir, extra_http_headers=headers,
+        )
+        self.browser = context
+        self.page = context.pages[0] if context.pages else context.new_page()
+
+    def _open_home(self, base_url, token, timeout=15):
+        """
+        打开带token的后台首页, 导航栏加载完成说明已登录。
+        保存的登录状态被后台判定失效时会跳转到登录页, 此时返回False
+        """
+        self.page.goto(f'{base_url}/cgi-bin/home?t=home/index&lang=zh_CN&token={token}')
+        try:
+            self.page.wait_for_selector('#js_index_menu', timeout=timeout * 1000)
+        except PlaywrightTimeoutError:
+            return False
+        return True
+
+    def refresh_session(self, force=False):
+        """
+        保存最新的登录状态, 后台会在请求中续期cookie, 运行过程中定期保存, 避免下次运行时登录状态已过期。
+        同步版Playwright不能在其它线程中使用, 因此在下载的间隙调用, 距上次保存不足wechat_session_refresh_interval秒时跳过
+        """
+        if self.page is None or self.session_saved_at is None and not force:
+            return
+        if not force and time.monotonic() - self.session_saved_at < config.wechat_session_refresh_interval:
+            return
+        self.page.context.storage_state(path=self.session_path)
+        self.session_saved_at = time.monotonic()
+        warn_session_expiry(self.session_path)
+
+    def close(self):
+        """关闭浏览器, 持久化上下文关闭时会保存浏览器数据"""
+        if self.browser is not None:
+            self.browser.close()
+            self.browser = None
+        if self.playwright is not None:
+            self.playwright.stop()
+            self.playwright = None
+
+    @traced()
     def fetch_account_name(self):
         """
         账号名称在导航栏最下方
@@ -179,7 +273,7 @@ class WechatDataFetcher:
         if self.begin_date is not None:
             return self.begin_date
         # 读取tmp/locks/wechat_operation_data.lock文件, 根据self.account_name, 获取value
-        with Locker(self.lock_file_name) as lock_file:
+        with Locker(self.lock_file_name, self.lock_timeout) as lock_file:
             data = lock_file.get()
             last_download_date = data.get(self.account_name, None)
         # 如果last_download_date is not None, 其格式为'2023-01-01', 转化为pendulum.date对象
@@ -197,16 +291,21 @@ class WechatDataFetcher:
         self.prepare()
         self.login()
         self.fetch_account_name()
-        traffic_path = self.download_traffic_data()
-        article_7d_path = self.download_article_7d_data()
-        unpub_article_7d_path = self.download_unpub_article_7d_data()
+        # HTTP方式下载失败的文件, 回退到页面点击下载
+        http_paths = self.download_exports_via_http() if config.wechat_fetch_engine == 'http' else {}
+        traffic_path = self._emit('traffic', http_paths.get('traffic') or self.download_traffic_data())
+        article_7d_path = self._emit('article_7d', http_paths.get('article_7d') or self.download_article_7d_data())
+        unpub_article_7d_path = self._emit(
+            'unpub_article_7d', http_paths.get('unpub_article_7d') or self.download_unpub_article_7d_data())
+        # 文章详情在每个文件下载完成时回调
         article_detail_paths = self.download_article_detail_data()
         unpub_article_detial_paths = self.download_article_detail_data("未开启通知内容")
-        user_growth_path = self.download_user_data()
-        self.browser.close()
+        user_growth_path = self._emit('user_growth', http_paths.get('user_growth') or self.download_user_data())
+        self.refresh_session()
+        self.close()
 
         # 清理，获取账号名称，更新locker文件，值为今天的日期，使用pendulum处理，格式为'2023-01-01'
-        with Locker(self.lock_file_name) as lock_file:
+        with Locker(self.lock_file_name, self.lock_timeout) as lock_file:
             data = lock_file.get()
             data[self.account_name] = pendulum.now().format('YYYY-MM-DD')
             lock_file.set(data)
@@ -218,16 +317,70 @@ class WechatDataFetcher:
             "download_paths":  [traffic_path, article_7d_path, unpub_article_7d_path, article_detail_paths, unpub_article_detial_paths, user_growth_path]
         }
 
+    def _emit(self, kind, paths):
+        """文件下载完成: 按间隔刷新登录状态, 调用下载完成的回调, 返回paths"""
+        self.refresh_session()
+        if self.on_download is not None:
+            self.on_download(self.account_name, kind, paths)
+        return paths
+
+    @traced()
+    def download_exports_via_http(self):
+        """
+        通过HTTP直接请求导出接口, 并发下载按日期范围导出的文件: 流量分析、已通知内容、未开启通知内容、用户增长。
+        日期范围与页面下载一致, 同样按窗口拆分, 文件名与页面下载一致。
+        :return: {名称: 文件路径列表}, 只包含所有窗口都下载成功的文件
+        """
+        exports = [
+            ('traffic', 'traffic_data', self.cal_begin_date()),
+            ('article_7d', 'article_7d_data', self.cal_begin_date(7)),
+            ('unpub_article_7d', 'unpub_article_7d_data', self.cal_begin_date(7)),
+            ('user_growth', 'user_growth_data', self.cal_begin_date()),
+        ]
+        jobs = []
+        for name, file_prefix, begin_date in exports:
+            for begin, end in wechat_date_picker.split_date_range(begin_date, self.end_date):
+                params = {'begin_date': begin.format('YYYY-MM-DD'), 'end_date': end.format('YYYY-MM-DD')}
+                jobs.append((name, params, self.tmp_data_dir / self._window_file_name(file_prefix, begin, end)))
+
+        async def download():
+            async with WechatExportClient(self.session_path) as client:
+                return await client.download_many(jobs)
+
+        # 同步版Playwright占用了当前线程的事件循环, 在单独的线程中运行异步客户端
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                results = executor.submit(asyncio.run, download()).result()
+        except ExportError as e:
+            print(f'HTTP导出不可用, 使用页面下载: {e}')
+            return {}
+
+        paths = {}
+        failed = set()
+        for (name, params, _), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                print(f"HTTP导出{name}({params['begin_date']}~{params['end_date']})失败, 使用页面下载: {result}")
+                failed.add(name)
+            else:
+                paths.setdefault(name, []).append(result)
+                current_span().add_file(result)
+        return {name: name_paths for name, name_paths in paths.items() if name not in failed}
+
+    def save_article_freshness(self):
+        """数据处理完成后保存文章新鲜度索引, 之后的运行会跳过数据已固定的文章"""
+        if self.article_freshness is not None:
+            self.article_freshness.save()
+
+    @traced()
     def download_traffic_data(self):
         self.page.click('text=数据分析')
         # 随机等待
-        time.sleep(random.uniform(0.5, 3))
+        self.pacer.pause(0.5, 3, self.page)
         self.page.click('text=内容分析')
         # 随机等待
-        time.sleep(random.uniform(0.5, 3))
+        self.pacer.pause(0.5, 3, self.page)
         # 随机滚动
-        scroll_distance = random.randint(100, 500)
-        self.page.evaluate(f'window.scrollBy(0, {scroll_distance});')
+        self.pacer.scroll(self.page)
         # 确保下载链接可见并点击
         # 定位第一个"下载数据明细"超链接，必须等待元素出现
         self.page.wait_for_selector('text=下载数据明细')
@@ -237,22 +390,23 @@ class WechatDataFetcher:
         self.page.evaluate('element => element.scrollIntoView()', first_download_link)
         # 等待元素可见
         self.page.wait_for_selector('text=下载数据明细', state='visible')
-        time.sleep(random.uniform(0.5, 2))  # 随机等待确保元素完全可见
+        self.pacer.pause(0.5, 2)  # 随机等待确保元素完全可见
 
         # 根据self.cal_begin_date()和self.end_date来选择下载的日期范围
-        wechat_date_picker.pick_date(self.cal_begin_date(), self.end_date, self.page, self.page.query_selector('//form[@class="mass_all_filter"]'))
-        download_file_path = self.tmp_data_dir / 'traffic_data.xlsx'
-        self._wait_for_download(lambda: first_download_link.click(), download_file_path)
-        return download_file_path        
+        def download_window(begin, end, download_file_path):
+            wechat_date_picker.pick_date(begin, end, self.page, self.page.query_selector('//form[@class="mass_all_filter"]'))
+            self._wait_for_download(lambda: first_download_link.click(), download_file_path)
+        return self._download_windows('traffic_data', self.cal_begin_date(), download_window)
 
+    @traced()
     def download_article_7d_data(self):
         # 检查“内容分析”是否可见
         if not self.page.is_visible('text=内容分析'):
             self.page.click('text=数据分析')
-            time.sleep(random.uniform(0.5, 3))
+            self.pacer.pause(0.5, 3, self.page)
         self.page.click('text=内容分析')
         # 随机等待
-        time.sleep(random.uniform(0.5, 3))
+        self.pacer.pause(0.5, 3, self.page)
         # 直接点击"已通知内容"的a标签
         self.page.click('a:has-text("已通知内容")')
         # 等待“下载明细数据”a标签可见
@@ -260,12 +414,13 @@ class WechatDataFetcher:
 
         # 更精确地定位日期选择器的父元素，先找到包含日期选择器的面板
         date_picker_parent = self.page.query_selector('div.weui-desktop-panel__bd form')
-        wechat_date_picker.pick_date(self.cal_begin_date(7), self.end_date, self.page, date_picker_parent)
 
-        download_file_path = self.tmp_data_dir / 'article_7d_data.xlsx'
-        self._wait_for_download(lambda: self.page.click('a:has-text("下载数据明细")'), download_file_path)
-        return download_file_path
+        def download_window(begin, end, download_file_path):
+            wechat_date_picker.pick_date(begin, end, self.page, date_picker_parent)
+            self._wait_for_download(lambda: self.page.click('a:has-text("下载数据明细")'), download_file_path)
+        return self._download_windows('article_7d_data', self.cal_begin_date(7), download_window)
 
+    @traced()
     def download_unpub_article_7d_data(self):
         """
         下载“未开启通知内容“的数据，按文章维度统计文章发表后 7 日内的数据。
@@ -274,30 +429,31 @@ class WechatDataFetcher:
         # 检查“内容分析”是否可见
         if not self.page.is_visible('text=内容分析'):
             self.page.click('text=数据分析')
-            time.sleep(random.uniform(0.5, 3))
+            self.pacer.pause(0.5, 3, self.page)
         self.page.click('text=内容分析')
         # 随机等待
-        time.sleep(random.uniform(0.5, 3))
+        self.pacer.pause(0.5, 3, self.page)
         # 点击“未开启通知内容” tab
         self.page.click('a:has-text("未开启通知内容")')
         # 等待“下载明细数据”a标签可见
         self.page.wait_for_selector('a:has-text("下载数据明细")', state='visible')
         # 更精确地定位日期选择器的父元素，先找到包含日期选择器的面板
         date_picker_parent = self.page.query_selector('div.weui-desktop-panel__bd form')    
-        wechat_date_picker.pick_date(self.cal_begin_date(7), self.end_date, self.page, date_picker_parent)
 
-        download_file_path = self.tmp_data_dir / 'unpub_article_7d_data.xlsx'
-        self._wait_for_download(lambda: self.page.click('a:has-text("下载数据明细")'), download_file_path)
-        return download_file_path
+        def download_window(begin, end, download_file_path):
+            wechat_date_picker.pick_date(begin, end, self.page, date_picker_parent)
+            self._wait_for_download(lambda: self.page.click('a:has-text("下载数据明细")'), download_file_path)
+        return self._download_windows('unpub_article_7d_data', self.cal_begin_date(7), download_window)
 
+    @traced()
     def download_article_detail_data(self, article_type='已通知内容'):
         # 检查“内容分析”是否可见
         if not self.page.is_visible('text=内容分析'):
             self.page.click('text=数据分析')
-            time.sleep(random.uniform(0.5, 3))
+            self.pacer.pause(0.5, 3, self.page)
         self.page.click('text=内容分析')
         # 随机等待
-        time.sleep(random.uniform(0.5, 3))
+        self.pacer.pause(0.5, 3, self.page)
         # 直接点击"已通知内容"的a标签
         self.page.click(f'a:has-text("{article_type}")')
         # 确保class="weui-desktop-table"的表格加载
@@ -305,14 +461,46 @@ class WechatDataFetcher:
 
         # 更精确地定位日期选择器的父元素，先找到包含日期选择器的面板
         date_picker_parent = self.page.query_selector('div.weui-desktop-panel__bd form')
-        wechat_date_picker.pick_date(self.cal_begin_date(30), self.end_date, self.page, date_picker_parent)
-        
+
+        # 发表超过30日且已经下载过最终数据的文章不再下载
+        if self.article_freshness is None:
+            self.article_freshness = ArticleFreshnessIndex(self.account_name)
+
+        # 日期范围超过日期选择器的跨度时, 逐个窗口下载
         download_file_paths = []
+        for begin, end in wechat_date_picker.split_date_range(self.cal_begin_date(30), self.end_date):
+            wechat_date_picker.pick_date(begin, end, self.page, date_picker_parent)
+            download_file_paths.extend(self._download_article_details_in_range(article_type))
+        return download_file_paths
+
+    def _download_article_details_in_range(self, article_type):
+        """下载日期选择器当前日期范围内所有文章的详情数据"""
+        freshness = self.article_freshness
+
+        download_file_paths = []
+        # 并发模式: 先收集所有详情链接, 再用多个标签页并发下载
+        if config.wechat_detail_concurrency > 1:
+            detail_rows, complete = self._collect_article_detail_rows()
+            if detail_rows:
+                pending_rows = []
+                for detail_row in detail_rows:
+                    key = freshness.article_key(detail_row['url'])
+                    freshness.observe(key, freshness.parse_publish_date(detail_row['text']))
+                    if not freshness.is_final(key):
+                        pending_rows.append(detail_row)
+                print(f'{article_type}: 共 {len(detail_rows)} 篇文章, 跳过数据已固定的文章 {len(detail_rows) - len(pending_rows)} 篇')
+                download_file_paths.extend(
+                    self._download_article_details_concurrently(pending_rows, config.wechat_detail_concurrency))
+            if complete:
+                return download_file_paths
+            # 表格停留在没有地址的一页, 从这一页开始逐个点击, 之前的页已经并发下载
+            print('详情链接没有地址, 从当前页开始使用逐个点击的方式下载')
+
         def process_articles():
             """处理文章表格数据，包括等待表格加载和处理每行数据"""
             # 等待表格加载完成
             self.page.wait_for_selector('table.weui-desktop-table', state='attached')
-            time.sleep(1)  # 额外等待1秒确保完全加载
+            self.pacer.pause(1, 1, self.page)  # 额外等待确保完全加载
             
             table = self.page.query_selector('table.weui-desktop-table')
             rows = table.query_selector_all('tbody tr')  # 只获取tbody中的tr元素
@@ -321,41 +509,45 @@ class WechatDataFetcher:
                 a_tag = row.query_selector('a:has-text("详情")')
                 if not a_tag:
                     continue
+                article_key = freshness.article_key(a_tag.evaluate('a => a.href'))
+                freshness.observe(article_key, freshness.parse_publish_date(row.inner_text()))
+                if freshness.is_final(article_key):
+                    continue
 
-                while not a_tag.is_visible():
-                    self.page.evaluate('window.scrollBy(0, 100);')
-                    time.sleep(0.5)
+                self.pacer.reveal(self.page, a_tag)
 
                 # 随机等待
-                time.sleep(random.uniform(0.5, 2))
-
-                # 打开详情链接，会新开标签页
-                with self.page.context.expect_page() as new_page_info:
-                    a_tag.click()
-                new_page = new_page_info.value
-                # 等待新页面加载完成
-                new_page.wait_for_load_state()
+                self.pacer.pause(0.5, 2)
+
+                with span('article_detail_tab') as tab_span:
+                    # 打开详情链接，会新开标签页
+                    with self.page.context.expect_page() as new_page_info:
+                        a_tag.click()
+                    new_page = new_page_info.value
+                    # 等待新页面加载完成
+                    new_page.wait_for_load_state()
                 
-                try:
-                    # 在新页面中等待下载链接可见
-                    new_page.wait_for_selector('a:has-text("下载数据明细")', state='visible')
-                    # 获取文章标题
-                    title = new_page.text_content('//div[contains(@class, "top_title")]//span[contains(@class, "weui-desktop-breadcrum")]')
-                    # 随机等待
-                    time.sleep(random.uniform(1, 5))
-                    # 在新页面中点击下载
-                    download_file_path = self.tmp_data_dir / f'{title}.xlsx'
-                    self._wait_for_download(lambda: new_page.click('a:has-text("下载数据明细")'), download_file_path, new_page)
-                    download_file_paths.append(download_file_path)
-
-                    # 模拟人类操作行为
-                    time.sleep(random.uniform(0.5, 3))
-                    scroll_distance = random.randint(100, 500)
-                    new_page.evaluate(f'window.scrollBy(0, {scroll_distance});')
-                finally:
-                    # 关闭新标签页并切换回原页面
-                    new_page.close()
-                    self.page.bring_to_front()
+                    try:
+                        # 在新页面中等待下载链接可见
+                        new_page.wait_for_selector('a:has-text("下载数据明细")', state='visible')
+                        # 获取文章标题
+                        title = new_page.text_content('//div[contains(@class, "top_title")]//span[contains(@class, "weui-desktop-breadcrum")]')
+                        # 随机等待
+                        self.pacer.pause(1, 5)
+                        # 在新页面中点击下载
+                        download_file_path = self.tmp_data_dir / f'{title}.xlsx'
+                        self._wait_for_download(lambda: new_page.click('a:has-text("下载数据明细")'), download_file_path, new_page)
+                        download_file_paths.append(self._emit('article_detail', download_file_path))
+                        tab_span.add_file(download_file_path)
+                        freshness.mark_fetched(article_key, title)
+
+                        # 模拟人类操作行为
+                        self.pacer.pause(0.5, 3)
+                        self.pacer.scroll(new_page)
+                    finally:
+                        # 关闭新标签页并切换回原页面
+                        new_page.close()
+                        self.page.bring_to_front()
 
         # 执行文章处理
         process_articles()
@@ -363,7 +555,7 @@ class WechatDataFetcher:
         # 处理分页，检查“下一页”按钮是否存在，且可见，则点击下一页，然后滚动到顶部，处理文章
         while self.page.is_visible('a:has-text("下一页")'):
             self.page.click('a:has-text("下一页")')
-            time.sleep(random.uniform(1, 3))
+            self.pacer.pause(1, 3, self.page)
             # 滚动到顶部
             self.page.evaluate('window.scrollTo(0, 0);')
             # 处理文章
@@ -371,34 +563,130 @@ class WechatDataFetcher:
 
         return download_file_paths
 
-        
+
+    def _collect_article_detail_rows(self):
+        """
+        翻页收集文章表格中所有"详情"链接的地址, 以及所在行的文字(包含发表日期)
+        :return: ([{'url', 'text'}], complete), 某一页的"详情"链接没有地址时停止收集, 表格停留在这一页,
+                 返回之前各页收集到的链接, complete为False
+        """
+        detail_rows = []
+        while True:
+            self.page.wait_for_selector('table.weui-desktop-table', state='attached')
+            # 每行"详情"链接的地址和行文字, 没有"详情"链接的行为null
+            rows = self.page.eval_on_selector_all('table.weui-desktop-table tbody tr', """
+                rows => rows.map(row => {
+                    const a = Array.from(row.querySelectorAll('a')).find(a => a.textContent.includes('详情'));
+                    return a ? {url: a.href || '', text: row.innerText} : null;
+                })
+            """)
+            rows = [row for row in rows if row is not None]
+            hrefs = [row['url'] for row in rows]
+            if '' in hrefs:
+                return detail_rows, False
+            detail_rows.extend(rows)
+
+            if not self.page.is_visible('a:has-text("下一页")'):
+                break
+            self.page.click('a:has-text("下一页")')
+            # 等待表格内容换成下一页
+            if hrefs:
+                self.page.wait_for_function("""
+                    first => {
+                        const a = Array.from(document.querySelectorAll('table.weui-desktop-table tbody tr a'))
+                            .find(a => a.textContent.includes('详情'));
+                        return a && a.href !== first;
+                    }
+                """, arg=hrefs[0])
+            else:
+                self.page.wait_for_load_state('networkidle')
+        return detail_rows, True
+
+    def _download_article_details_concurrently(self, detail_rows, concurrency):
+        """
+        在同一个上下文中, 每批打开concurrency个标签页并发下载文章详情数据。
+        同一批的标签页同时加载、同时下载, 单篇文章失败不影响其它文章。
+        """
+        download_file_paths = []
+        context = self.page.context
+        for i in range(0, len(detail_rows), concurrency):
+            download_file_paths.extend(self._download_article_detail_batch(context, detail_rows[i:i + concurrency]))
+        return download_file_paths
+
+    @traced('article_detail_batch')
+    def _download_article_detail_batch(self, context, batch):
+        """同时打开一批详情标签页, 全部开始下载后再逐个保存"""
+        download_file_paths = []
+        pages = []
+        # 导航成功开始的标签页, 打开失败的文章记录后跳过, 不影响同一批的其它文章
+        opened = []
+        downloads = []
+        try:
+            for detail_row in batch:
+                try:
+                    new_page = context.new_page()
+                    pages.append(new_page)
+                    # 只等待导航开始, 同一批的标签页并行加载
+                    new_page.goto(detail_row['url'], wait_until='commit')
+                    opened.append((new_page, detail_row))
+                except Exception as e:
+                    print(f"文章详情打开失败 {detail_row['url']}: {e}")
+            for new_page, detail_row in opened:
+                try:
+                    new_page.wait_for_selector('a:has-text("下载数据明细")', state='visible')
+                    title = new_page.text_content('//div[contains(@class, "top_title")]//span[contains(@class, "weui-desktop-breadcrum")]')
+                    with new_page.expect_download() as download_info:
+                        new_page.click('a:has-text("下载数据明细")')
+                    downloads.append((detail_row, title, download_info.value))
+                except Exception as e:
+                    print(f'文章详情下载失败 {new_page.url}: {e}')
+            # 所有下载开始后再逐个保存
+            for detail_row, title, download in downloads:
+                download_file_path = self.tmp_data_dir / f'{title}.xlsx'
+                try:
+                    download.save_as(download_file_path)
+                    failure = download.failure()
+                    if failure is not None:
+                        raise IOError(f'文件下载失败: {failure}')
+                except Exception as e:
+                    print(f'文章详情保存失败 {title}: {e}')
+                    continue
+                download_file_paths.append(self._emit('article_detail', download_file_path))
+                current_span().add_file(download_file_path)
+                self.article_freshness.mark_fetched(self.article_freshness.article_key(detail_row['url']), title)
+        finally:
+            for new_page in pages:
+                new_page.close()
+            self.page.bring_to_front()
+        return download_file_paths
+
+    @traced('wait_for_download')
     def _wait_for_download(self, click_action, path=None, page=None, timeout=60):
         if page is None:
             page = self.page
-        with page.expect_download() as download_info:
+        with page.expect_download(timeout=timeout * 1000) as download_info:
             click_action()
         download = download_info.value
         if path is None:
             path = self.tmp_data_dir / download.suggested_filename
+        # save_as在下载完成后才返回, 不需要再轮询文件
         download.save_as(path)
-        # 轮询检查文件是否下载完成
-        start_time = pendulum.now()
-        while not path.exists():
-            if (pendulum.now() - start_time).total_seconds() > timeout:
-                raise TimeoutError('文件下载超时')
-            time.sleep(1)
+        failure = download.failure()
+        if failure is not None:
+            raise IOError(f'文件下载失败: {failure}')
+        current_span().add_file(path)
 
+    @traced()
     def download_user_data(self):
         # 检查“内容分析”是否可见
         if not self.page.is_visible('text=用户分析'):
             self.page.click('text=数据分析')
-            time.sleep(random.uniform(0.5, 3))
+            self.pacer.pause(0.5, 3, self.page)
         self.page.click('text=用户分析')
         # 随机等待
-        time.sleep(random.uniform(0.5, 3))
+        self.pacer.pause(0.5, 3, self.page)
         # 随机滚动页面
-        scroll_distance = random.randint(100, 500)
-        self.page.evaluate(f'window.scrollBy(0, {scroll_distance});')
+        self.pacer.scroll(self.page)
 
         # 等待“下载表格”链接可见
         self.page.wait_for_selector('text=下载表格', state='visible')
@@ -407,9 +695,27 @@ class WechatDataFetcher:
         # 滑动到链接使其可见
         self.page.evaluate('element => element.scrollIntoView()', download_link)
         # 随机等待确保元素完全可见
-        time.sleep(random.uniform(0.5, 2))
+        self.pacer.pause(0.5, 2)
         # 根据self.cal_begin_date()和self.end_date来选择下载的日期范围
-        wechat_date_picker.pick_date(self.cal_begin_date(), self.end_date, self.page, self.page.query_selector('//div[@class="mass_all_filter_sticky"]'))
-        download_file_path = self.tmp_data_dir / 'user_growth_data.xlsx'
-        self._wait_for_download(lambda: download_link.click(), download_file_path)
-        return download_file_path
\ No newline at end of file
+        def download_window(begin, end, download_file_path):
+            wechat_date_picker.pick_date(begin, end, self.page, self.page.query_selector('//div[@class="mass_all_filter_sticky"]'))
+            self._wait_for_download(lambda: download_link.click(), download_file_path)
+        return self._download_windows('user_growth_data', self.cal_begin_date(), download_window)
+
+    def _download_windows(self, file_prefix, begin_date, download_window):
+        """
+        日期选择器的跨度不能超过2个月, 将begin_date至self.end_date拆分为多个窗口, 逐个窗口下载。
+        文件名带上窗口的日期范围: {file_prefix}_{开始日期}_{结束日期}.xlsx
+        :param download_window: 下载单个窗口的函数, 参数为(begin, end, download_file_path)
+        :return: 按时间顺序排列的文件路径列表
+        """
+        download_file_paths = []
+        for begin, end in wechat_date_picker.split_date_range(begin_date, self.end_date):
+            download_file_path = self.tmp_data_dir / self._window_file_name(file_prefix, begin, end)
+            download_window(begin, end, download_file_path)
+            download_file_paths.append(download_file_path)
+        return download_file_paths
+
+    @staticmethod
+    def _window_file_name(file_prefix, begin, end):
+        return f"{file_prefix}_{begin.format('YYYYMMDD')}_{end.format('YYYYMMDD')}.xlsx"
\ No newline at end of file
@@ -1,8 +1,104 @@
 import pandas as pd
 import shutil
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from config import config
 from bs4 import BeautifulSoup  # 导入 BeautifulSoup
+from tools.tracing import traced, current_span
+from business.services.wechat_data_tables import TABLES, ParquetTableStore, anti_join, create_store
+
+
+def _as_path_list(paths):
+    """将单个路径或路径列表统一为列表"""
+    if paths is None:
+        return []
+    if isinstance(paths, (list, tuple)):
+        return list(paths)
+    return [paths]
+
+
+def parse_article_detail(article_path):
+    """
+    解析单个文章详情文件, 只依赖文件内容, 可以在子进程中执行
+    :return: (文章标题, {'article_detail', 'trend', 'gender', 'age', 'region'}), 文件中没有的表为None
+    """
+    article_title = Path(article_path).stem
+    # 读取文件
+    xls = pd.ExcelFile(article_path)
+    df = xls.parse(xls.sheet_names[0])        
+
+    # 去除左右空列
+    df = df.dropna(axis=1, how='all')
+    
+    # 提取子表
+    table_start_indices = df[df.isnull().all(axis=1)].index.tolist()
+    table_start_indices = [0] + [i + 1 for i in table_start_indices]
+    table_end_indices = table_start_indices[1:] + [len(df)]
+    
+    detail_summary = None
+    detail_read_convertion = None
+    detail_recommend_convertion = None
+    detail_trend = None
+    pub_date = None
+    detail_gender_distribution = None
+    detail_age_distribution = None
+    detail_region_distribution = None
+    
+    for start, end in zip(table_start_indices, table_end_indices):
+        sub_table = df.iloc[start:end].dropna(how='all')
+        if not sub_table.empty:
+            table_name = sub_table.iloc[0, 0]
+            sub_table = sub_table[2:].reset_index(drop=True)
+            sub_table.columns = df.iloc[start + 1]
+
+            # 删除空行空列
+            sub_table = sub_table.dropna(axis=0, how='all')
+            sub_table = sub_table.dropna(axis=1, how='all')
+            
+            if table_name == '数据概况':
+                detail_summary = sub_table.transpose()
+                detail_summary.columns = detail_summary.iloc[0]
+                detail_summary = detail_summary[1:].reset_index(drop=True)
+            elif table_name == '阅读转化':
+                detail_read_convertion = sub_table.transpose()
+                detail_read_convertion.columns = detail_read_convertion.iloc[0]
+                detail_read_convertion = detail_read_convertion[1:].reset_index(drop=True)
+            elif table_name == '推荐转化':
+                detail_recommend_convertion = sub_table.transpose()
+                detail_recommend_convertion.columns = detail_recommend_convertion.iloc[0]
+                detail_recommend_convertion = detail_recommend_convertion[1:].reset_index(drop=True)
+            elif table_name == '数据趋势明细':
+                detail_trend = sub_table
+                # 从 detail_trend 中提取 '日期' 列，转换为 datetime 类型，然后计算最小值
+                pub_date = pd.to_datetime(detail_trend['日期'], format='%Y-%m-%d').min()
+            elif table_name == '性别分布':
+                detail_gender_distribution = sub_table.drop('占比', axis=1)
+            elif table_name == '年龄分布':
+                detail_age_distribution = sub_table.drop('占比', axis=1)
+            elif table_name == '地域分布':
+                detail_region_distribution = sub_table.drop('占比', axis=1)
+                detail_region_distribution = detail_region_distribution[detail_region_distribution['省份/直辖市'] != '全国']
+    
+    # 处理文章汇总数据
+    article_detail = pd.concat([detail_summary, detail_read_convertion, detail_recommend_convertion], axis=1)
+    article_detail['文章标题'] = article_title
+    # pub_date为datetime类型, 转换为字符串
+    article_detail['发表日期'] = pub_date.strftime('%Y-%m-%d')
+
+    tables = {
+        'article_detail': article_detail,
+        'trend': detail_trend,
+        'gender': detail_gender_distribution,
+        'age': detail_age_distribution,
+        'region': detail_region_distribution,
+    }
+    for table in tables.values():
+        if table is not None:
+            table['文章标题'] = article_title
+    return article_title, tables
 
 
 class WechatDataPublisher:
@@ -20,7 +116,13 @@ class WechatDataPublisher:
         if not self.send_dir.exists():
             self.send_dir.mkdir(parents=True)
 
+        # parquet存储的分区表直接从分区生成CSV, 本地目录中的CSV可能不是最新的
+        exported = set()
+        if config.wechat_data_backend == 'parquet':
+            exported = ParquetTableStore(self.data_dir).export_csv(self.send_dir)
         for file_path in self.data_dir.glob('*.csv'):
+            if file_path.name in exported:
+                continue
             destination = self.send_dir / file_path.name
             shutil.copy2(file_path, destination)
         print("微信运营数据发布完成")
@@ -134,72 +236,86 @@ class WechatDataAnalyzer:
     """
     def __init__(self, account_name, traffic_path=None, article_7d_path=None, unpub_article_7d_path=None,
         article_detail_paths=None, unpub_article_detail_paths=None, user_growth_path=None):
+        """
+        traffic_path, article_7d_path, unpub_article_7d_path, user_growth_path 可以是单个文件路径,
+        也可以是按日期窗口拆分下载的多个文件路径, 多个文件会合并后一次处理
+        """
         self.account_name = account_name
-        self.traffic_path = traffic_path
-        self.article_7d_path = article_7d_path
-        self.unpub_article_7d_path = unpub_article_7d_path
+        self.traffic_path = _as_path_list(traffic_path)
+        self.article_7d_path = _as_path_list(article_7d_path)
+        self.unpub_article_7d_path = _as_path_list(unpub_article_7d_path)
         self.article_detail_paths = article_detail_paths or []
         self.unpub_article_detail_paths = unpub_article_detail_paths or []
-        self.user_growth_path = user_growth_path
+        self.user_growth_path = _as_path_list(user_growth_path)
         self.send_dir = Path(config.wechat_opt_data_dir) / self.account_name
         self.data_dir = Path(config.root_dir) / 'datas/wechat_operation_data' / self.account_name
         # 检查self.data_dir是否存在, 如果不存在, 则创建
         if not self.data_dir.exists():
             self.data_dir.mkdir(parents=True)
+        self.store = create_store(self.data_dir)
 
     def process_data(self):
         print('开始处理微信运营数据...')
-        self.process_traffic_data()
-        self.process_article_7d_data()
-        self.process_article_detail_data()
-        self.process_user_growth_data()
+        try:
+            self.process_traffic_data()
+            self.process_article_7d_data()
+            self.process_article_detail_data()
+            self.process_user_growth_data()
+            # 数据库存储时导出CSV, 供WechatDataPublisher发布
+            self.store.flush()
+        finally:
+            self.store.close()
         print('微信运营数据处理完成.')
 
+    def process_files(self, kind, paths):
+        """
+        处理一类刚下载完成的文件, 用于边下载边处理
+        :param kind: traffic | article_7d | unpub_article_7d | article_detail | user_growth
+        :param paths: 文件路径或路径列表
+        已通知内容和未开启通知内容需要一起合并, 两者都收到后才处理
+        """
+        paths = _as_path_list(paths)
+        if kind == 'traffic':
+            self.traffic_path = paths
+            self.process_traffic_data()
+        elif kind in ('article_7d', 'unpub_article_7d'):
+            setattr(self, f'{kind}_path', paths)
+            if self.article_7d_path and self.unpub_article_7d_path:
+                self.process_article_7d_data()
+        elif kind == 'article_detail':
+            self.article_detail_paths = paths
+            self.unpub_article_detail_paths = []
+            self.process_article_detail_data()
+        elif kind == 'user_growth':
+            self.user_growth_path = paths
+            self.process_user_growth_data()
+        else:
+            raise ValueError(f'未知的数据类型: {kind}')
+
+    @traced()
     def process_traffic_data(self):
         """
         处理流量数据
         """
         if self.traffic_path:
-            traffic_df = pd.read_excel(self.traffic_path)
+            traffic_df = pd.concat([pd.read_excel(path) for path in self.traffic_path], ignore_index=True)
+            current_span().add(rows=len(traffic_df))
             # 提取渠道为"全部"的数据
             traffic_summary = traffic_df[traffic_df['渠道'] == '全部']
             traffic = traffic_df[traffic_df['渠道'] != '全部']
 
-            # 检查本地文件是否存在
-            traffic_summary_path = self.data_dir / 'traffic_summary.csv'
-            traffic_path = self.data_dir / 'traffic.csv'
-
-            if traffic_summary_path.exists():
-                local_traffic_summary = pd.read_csv(traffic_summary_path)
-                # 合并时检查"日期"字段的重复记录，保留traffic_summary记录
-                local_traffic_summary = local_traffic_summary[~local_traffic_summary['日期'].isin(traffic_summary['日期'])]
-                traffic_summary = pd.concat([local_traffic_summary, traffic_summary], ignore_index=True)
-
-            if traffic_path.exists():
-                local_traffic = pd.read_csv(traffic_path)
-                # 合并时检查"日期"和"渠道"字段的重复记录，保留traffic记录
-                local_traffic = local_traffic[~local_traffic[['日期', '渠道']].apply(tuple, axis=1).isin(traffic[['日期', '渠道']].apply(tuple, axis=1))]
-                traffic = pd.concat([local_traffic, traffic], ignore_index=True)
-
-            # 合并后的数据按照日期倒序排序
-            if not traffic_summary.empty:
-                traffic_summary = traffic_summary.sort_values(by='日期', ascending=False)
-            if not traffic.empty:
-                traffic = traffic.sort_values(by='日期', ascending=False)
-
-            # 保存到本地文件
-            if not traffic_summary.empty:
-                traffic_summary.to_csv(traffic_summary_path, index=False)
-            if not traffic.empty:
-                traffic.to_csv(traffic_path, index=False)
+            # 合并到本地文件, 日期(和渠道)重复时保留下载的记录, 按照日期倒序排序
+            self.store.upsert('traffic_summary', traffic_summary)
+            self.store.upsert('traffic', traffic)
 
+    @traced()
     def process_article_7d_data(self):
         """处理7天内文章数据"""
         if self.article_7d_path:
             # 读取下载文件
-            article_7d = pd.read_excel(self.article_7d_path)
+            article_7d = pd.concat([pd.read_excel(path) for path in self.article_7d_path], ignore_index=True)
             article_7d['状态'] = '已发布'
-            unpub_article_7d = pd.read_excel(self.unpub_article_7d_path)
+            unpub_article_7d = pd.concat([pd.read_excel(path) for path in self.unpub_article_7d_path], ignore_index=True)
             unpub_article_7d['状态'] = '未发布'
             unpub_article_7d["送达人数"] = 0
             unpub_article_7d["送达阅读率"] = 0
@@ -208,202 +324,186 @@ class WechatDataAnalyzer:
             unpub_article_7d = unpub_article_7d.dropna(how='all')
             # 合并article_7d和unpub_article_7d
             article_7d = pd.concat([article_7d, unpub_article_7d], ignore_index=True)
+            current_span().add(rows=len(article_7d))
 
-            # 检查本地文件是否存在
-            article_7d_path = self.data_dir / 'article_7d.csv'
-            
-            if article_7d_path.exists():
-                # 读取本地文件
-                local_article_7d = pd.read_csv(article_7d_path)
-                
-                # 合并时检查“内容标题”字段的重复记录，保留article_7d记录
-                local_article_7d = local_article_7d[~local_article_7d['内容标题'].isin(article_7d['内容标题'])]
-                article_7d = pd.concat([local_article_7d, article_7d], ignore_index=True)
-            
-            # 合并后的数据按照日期倒序排序
-            if not article_7d.empty:
-                article_7d = article_7d.sort_values(by='发表时间', ascending=False)
-            
-            # 保存到本地文件
-            if not article_7d.empty:
-                article_7d.to_csv(article_7d_path, index=False)
+            # 合并到本地文件, “内容标题”重复时保留下载的记录, 按照发表时间倒序排序
+            self.store.upsert('article_7d', article_7d)
 
+    @traced()
     def process_article_detail_data(self):
-        """处理文章详情数据"""
+        """
+        处理文章详情数据
+        先解析所有详情文件, 每个目标表在内存中合并新数据后, 只读取、合并、写入本地文件一次。
+        同一篇文章有多个文件时, 与逐个文件合并的结果一致: 按文章合并的表保留最后一个文件的数据,
+        趋势明细按(文章标题, 日期)保留最后一个文件的数据。
+        """
         # 合并数据self.article_detail_paths和self.unpub_article_detail_paths
         self.article_detail_paths = self.article_detail_paths + self.unpub_article_detail_paths
+        if not self.article_detail_paths:
+            return
 
-        for article_path in self.article_detail_paths:
-            article_title = Path(article_path).stem
-            # 读取文件
-            xls = pd.ExcelFile(article_path)
-            df = xls.parse(xls.sheet_names[0])        
+        # 按文章合并的表, 同一篇文章保留最后一个文件的数据
+        article_tables = {name: {} for name in ('article_detail', 'gender', 'age', 'region')}
+        # 趋势明细: {文章标题: [DataFrame]}, 后面的文件覆盖前面文件中相同日期的数据
+        detail_trends = {}
+        for article_title, tables in self._parse_article_details(self.article_detail_paths):
+            current_span().add(rows=len(tables['article_detail']))
+            for name in article_tables:
+                if tables[name] is not None:
+                    article_tables[name][article_title] = tables[name]
+            if tables['trend'] is not None:
+                earlier_trends = detail_trends.get(article_title, [])
+                detail_trends[article_title] = [
+                    anti_join(trend, tables['trend'], TABLES['article_trend_detail'].keys) for trend in earlier_trends
+                ] + [tables['trend']]
 
-            # 去除左右空列
-            df = df.dropna(axis=1, how='all')
-            
-            # 提取子表
-            table_start_indices = df[df.isnull().all(axis=1)].index.tolist()
-            table_start_indices = [0] + [i + 1 for i in table_start_indices]
-            table_end_indices = table_start_indices[1:] + [len(df)]
-            
-            detail_summary = None
-            detail_read_convertion = None
-            detail_recommend_convertion = None
-            detail_trend = None
-            pub_date = None
-            detail_gender_distribution = None
-            detail_age_distribution = None
-            detail_region_distribution = None
-            
-            for start, end in zip(table_start_indices, table_end_indices):
-                sub_table = df.iloc[start:end].dropna(how='all')
-                if not sub_table.empty:
-                    table_name = sub_table.iloc[0, 0]
-                    sub_table = sub_table[2:].reset_index(drop=True)
-                    sub_table.columns = df.iloc[start + 1]
-
-                    # 删除空行空列
-                    sub_table = sub_table.dropna(axis=0, how='all')
-                    sub_table = sub_table.dropna(axis=1, how='all')
-                    
-                    if table_name == '数据概况':
-                        detail_summary = sub_table.transpose()
-                        detail_summary.columns = detail_summary.iloc[0]
-                        detail_summary = detail_summary[1:].reset_index(drop=True)
-                    elif table_name == '阅读转化':
-                        detail_read_convertion = sub_table.transpose()
-                        detail_read_convertion.columns = detail_read_convertion.iloc[0]
-                        detail_read_convertion = detail_read_convertion[1:].reset_index(drop=True)
-                    elif table_name == '推荐转化':
-                        detail_recommend_convertion = sub_table.transpose()
-                        detail_recommend_convertion.columns = detail_recommend_convertion.iloc[0]
-                        detail_recommend_convertion = detail_recommend_convertion[1:].reset_index(drop=True)
-                    elif table_name == '数据趋势明细':
-                        detail_trend = sub_table
-                        # 从 detail_trend 中提取 '日期' 列，转换为 datetime 类型，然后计算最小值
-                        pub_date = pd.to_datetime(detail_trend['日期'], format='%Y-%m-%d').min()
-                    elif table_name == '性别分布':
-                        detail_gender_distribution = sub_table.drop('占比', axis=1)
-                    elif table_name == '年龄分布':
-                        detail_age_distribution = sub_table.drop('占比', axis=1)
-                    elif table_name == '地域分布':
-                        detail_region_distribution = sub_table.drop('占比', axis=1)
-                        detail_region_distribution = detail_region_distribution[detail_region_distribution['省份/直辖市'] != '全国']
-            
-            # 处理文章汇总数据
-            article_detail = pd.concat([detail_summary, detail_read_convertion, detail_recommend_convertion], axis=1)
-            article_detail['文章标题'] = article_title
-            # pub_date为datetime类型, 转换为字符串
-            article_detail['发表日期'] = pub_date.strftime('%Y-%m-%d')
-            
-            article_detail_path = self.data_dir / 'article_detail.csv'
-            if article_detail_path.exists():
-                local_article_detail = pd.read_csv(article_detail_path)
-                local_article_detail = local_article_detail[local_article_detail['文章标题'] != article_title]
-                article_detail = pd.concat([local_article_detail, article_detail], ignore_index=True)
-            if not article_detail.empty:
-                article_detail = article_detail.sort_values(by='发表日期', ascending=False)
-                article_detail.to_csv(article_detail_path, index=False)
-            
-            # 处理趋势明细数据
-            if detail_trend is not None:
-                detail_trend['文章标题'] = article_title
-                article_trend_detail_path = self.data_dir / 'article_trend_detail.csv'
-                if article_trend_detail_path.exists():
-                    local_article_trend_detail = pd.read_csv(article_trend_detail_path)
-                    local_article_trend_detail = local_article_trend_detail[~((local_article_trend_detail['文章标题'] == article_title) & (local_article_trend_detail['日期'].isin(detail_trend['日期'])))]
-                    detail_trend = pd.concat([local_article_trend_detail, detail_trend], ignore_index=True)
-                if not detail_trend.empty:
-                    detail_trend = detail_trend.sort_values(by='日期', ascending=False)
-                    detail_trend.to_csv(article_trend_detail_path, index=False)
-            
-            # 处理性别分布数据
-            if detail_gender_distribution is not None:
-                detail_gender_distribution['文章标题'] = article_title
-                article_gender_distribution_path = self.data_dir / 'article_gender_distribution.csv'
-                if article_gender_distribution_path.exists():
-                    local_article_gender_distribution = pd.read_csv(article_gender_distribution_path)
-                    local_article_gender_distribution = local_article_gender_distribution[local_article_gender_distribution['文章标题'] != article_title]
-                    detail_gender_distribution = pd.concat([local_article_gender_distribution, detail_gender_distribution], ignore_index=True)
-                if not detail_gender_distribution.empty:
-                    detail_gender_distribution = detail_gender_distribution.sort_values(by='文章标题', ascending=False)
-                    detail_gender_distribution.to_csv(article_gender_distribution_path, index=False)
-            
-            # 处理年龄分布数据
-            if detail_age_distribution is not None:
-                detail_age_distribution['文章标题'] = article_title
-                article_age_distribution_path = self.data_dir / 'article_age_distribution.csv'
-                if article_age_distribution_path.exists():
-                    local_article_age_distribution = pd.read_csv(article_age_distribution_path)
-                    local_article_age_distribution = local_article_age_distribution[local_article_age_distribution['文章标题'] != article_title]
-                    detail_age_distribution = pd.concat([local_article_age_distribution, detail_age_distribution], ignore_index=True)
-                if not detail_age_distribution.empty:
-                    detail_age_distribution = detail_age_distribution.sort_values(by='文章标题', ascending=False)
-                    detail_age_distribution.to_csv(article_age_distribution_path, index=False)
-            
-            # 处理地域分布数据
-            if detail_region_distribution is not None:
-                detail_region_distribution['文章标题'] = article_title
-                article_region_distribution_path = self.data_dir / 'article_region_distribution.csv'
-                if article_region_distribution_path.exists():
-                    local_article_region_distribution = pd.read_csv(article_region_distribution_path)
-                    local_article_region_distribution = local_article_region_distribution[local_article_region_distribution['文章标题'] != article_title]
-                    detail_region_distribution = pd.concat([local_article_region_distribution, detail_region_distribution], ignore_index=True)
-                if not detail_region_distribution.empty:
-                    detail_region_distribution = detail_region_distribution.sort_values(by='文章标题', ascending=False)
-                    detail_region_distribution.to_csv(article_region_distribution_path, index=False)
+        # 处理文章汇总数据
+        self._upsert_articles('article_detail', article_tables['article_detail'])
 
+        # 处理趋势明细数据
+        if detail_trends:
+            self.store.upsert('article_trend_detail',
+                   pd.concat([trend for trends in detail_trends.values() for trend in trends], ignore_index=True))
+
+        # 处理性别分布、年龄分布、地域分布数据
+        self._upsert_articles('article_gender_distribution', article_tables['gender'])
+        self._upsert_articles('article_age_distribution', article_tables['age'])
+        self._upsert_articles('article_region_distribution', article_tables['region'])
+
+    def _parse_article_details(self, article_paths):
+        """
+        解析文章详情文件, 解析是CPU密集的openpyxl操作, 文件较多时使用进程池并行解析, 主进程只负责合并结果。
+        进程数由配置WECHAT_PARSE_WORKERS指定, 1表示在当前进程中逐个解析;
+        文件数少于WECHAT_PARSE_MIN_FILES时同样逐个解析
+        :return: 与article_paths顺序一致的[(文章标题, 表)]
+        """
+        workers = min(config.wechat_parse_workers, len(article_paths))
+        if workers <= 1 or len(article_paths) < config.wechat_parse_min_files:
+            return [parse_article_detail(article_path) for article_path in article_paths]
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as executor:
+            chunksize = max(1, len(article_paths) // (workers * 4))
+            return list(executor.map(parse_article_detail, article_paths, chunksize=chunksize))
+
+    def _upsert_articles(self, table_name, frames):
+        """
+        合并按文章标题组织的新数据, 本地文件中这些文章的记录全部替换
+        :param frames: {文章标题: DataFrame}
+        """
+        if frames:
+            self.store.upsert(table_name, pd.concat(frames.values(), ignore_index=True))
+
+    @traced()
     def process_user_growth_data(self):
         """
         处理用户增长数据
         """
         if self.user_growth_path:
-            try:
-                # 读取 HTML 文件
-                with open(self.user_growth_path, 'r', encoding='utf-8') as file:
-                    html_content = file.read()
-                
-                # 使用 BeautifulSoup 解析 HTML
-                soup = BeautifulSoup(html_content, 'html.parser')
-                table = soup.find('table')
-                if not table:
-                    print(f"未在 {self.user_growth_path} 中找到表格数据")
-                    return
-                
-                # 提取表头
-                header_row = table.find('tr', class_='header')
-                if not header_row:
-                    print(f"未在 {self.user_growth_path} 的表格中找到表头")
-                    return
-                headers = [th.get_text(strip=True) for th in header_row.find_all('th')]
-                
-                # 提取数据行
-                data_rows = []
-                for row in header_row.find_all_next('tr'):
-                    cells = [td.get_text(strip=True) for td in row.find_all('th')]
-                    if cells:
-                        data_rows.append(cells)
-                
-                # 创建 DataFrame
-                user_growth = pd.DataFrame(data_rows, columns=headers)
+            user_growth_frames = [self._read_user_growth(path) for path in self.user_growth_path]
+            if any(frame is None for frame in user_growth_frames):
+                return
+            user_growth = pd.concat(user_growth_frames, ignore_index=True)
+            current_span().add(rows=len(user_growth))
 
+            # 合并到本地文件, “时间”重复时保留下载的记录, 按照日期倒序排序
+            self.store.upsert('user_growth', user_growth)
+
+    def _read_user_growth(self, user_growth_path):
+        """
+        读取用户增长数据文件, 该文件的后缀名为xlsx, 但实际为html文档
+        :return: DataFrame, 读取失败时返回None
+        """
+        try:
+            # 读取 HTML 文件
+            with open(user_growth_path, 'r', encoding='utf-8') as file:
+                html_content = file.read()
+            
+            # 使用 BeautifulSoup 解析 HTML
+            soup = BeautifulSoup(html_content, 'html.parser')
+            table = soup.find('table')
+            if not table:
+                print(f"未在 {user_growth_path} 中找到表格数据")
+                return None
+            
+            # 提取表头
+            header_row = table.find('tr', class_='header')
+            if not header_row:
+                print(f"未在 {user_growth_path} 的表格中找到表头")
+                return None
+            headers = [th.get_text(strip=True) for th in header_row.find_all('th')]
+            
+            # 提取数据行
+            data_rows = []
+            for row in header_row.find_all_next('tr'):
+                cells = [td.get_text(strip=True) for td in row.find_all('th')]
+                if cells:
+                    data_rows.append(cells)
+            
+            # 创建 DataFrame
+            return pd.DataFrame(data_rows, columns=headers)
+
+        except Exception as e:
+            print(f"读取 {user_growth_path} 时出错: {e}")
+            return None
+
+
+class WechatDataPipeline:
+    """
+    边下载边处理: WechatDataFetcher每下载完成一类文件(文章详情为每个文件)就放入队列,
+    后台线程立即解析并合并到本地数据, 处理时间与下载时间重叠, 下载中途失败时已下载的文件也已处理。
+
+    使用示例:
+    ```python
+    pipeline = WechatDataPipeline()
+    pipeline.start()
+    crawler.on_download = pipeline.put
+    try:
+        crawler.download_all()
+    finally:
+        succeeded = pipeline.close()
+    ```
+    """
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.analyzer = None
+        self.errors = []
+        self.thread = threading.Thread(target=self._work, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def put(self, account_name, kind, paths):
+        self.queue.put((account_name, kind, paths))
+
+    def close(self):
+        """等待队列中的文件处理完成, 返回是否全部处理成功"""
+        self.queue.put(None)
+        self.thread.join()
+        return not self.errors
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self._flush()
+                break
+            account_name, kind, paths = item
+            try:
+                if self.analyzer is None:
+                    self.analyzer = WechatDataAnalyzer(account_name)
+                self.analyzer.process_files(kind, paths)
             except Exception as e:
-                print(f"读取 {self.user_growth_path} 时出错: {e}")
-                return
+                print(f'处理{kind}数据失败 {paths}: {e}')
+                self.errors.append((kind, paths, e))
 
-            # 检查本地文件是否存在
-            user_growth_csv_path = self.data_dir / 'user_growth.csv'
-            if user_growth_csv_path.exists():
-                # 读取本地文件
-                local_user_growth = pd.read_csv(user_growth_csv_path)
-                # 合并时检查“时间”字段的重复记录，保留 user_growth 记录
-                local_user_growth = local_user_growth[~local_user_growth['时间'].isin(user_growth['时间'])]
-                user_growth = pd.concat([local_user_growth, user_growth], ignore_index=True)
-
-            # 合并后的数据按照日期倒序排序
-            if not user_growth.empty:
-                user_growth['时间'] = pd.to_datetime(user_growth['时间'])
-                user_growth = user_growth.sort_values(by='时间', ascending=False)
-                # 保存到本地文件
-                user_growth.to_csv(user_growth_csv_path, index=False)
\ No newline at end of file
+    def _flush(self):
+        """数据库存储的连接只能在创建它的线程中使用, 在后台线程中导出CSV"""
+        if self.analyzer is None:
+            return
+        try:
+            self.analyzer.store.flush()
+        except Exception as e:
+            print(f'导出数据失败: {e}')
+            self.errors.append(('flush', None, e))
+        finally:
+            self.analyzer.store.close()
@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    微信运营数据表的定义和合并(upsert)。
+    每个表由TableSpec声明: 文件名、主键字段、排序字段和字段类型。合并时删除本地数据中与新数据主键相同的记录,
+    追加新数据, 按排序字段倒序排序后写回, 新数据优先。
+    主键使用MultiIndex整体比较, 不需要逐行构造元组。
+
+    数据可以保存在三种存储中, 由配置WECHAT_DATA_BACKEND选择:
+    - csv: 每个表一个CSV文件, 每次合并读取并重写整个文件
+    - sqlite: 所有表保存在{data_dir}/wechat_data.db中, 主键唯一的表使用INSERT ... ON CONFLICT DO UPDATE,
+      其它表在主键索引上删除后插入, 更新的开销只与新数据的行数有关。
+      处理完成后将更新过的表导出为CSV, WechatDataPublisher仍然发布CSV文件。
+    - parquet: 按日期组织、历史数据不再变化的表(TableSpec.partition_by)按月分区保存为Parquet,
+      合并时只读写新数据所在月份的分区, 其它表仍然保存为CSV。需要安装pyarrow。
+      处理时不再导出分区表的CSV, 发布时由WechatDataPublisher从分区直接生成, compact时同时导出到本地目录。
+      compact还用于合并分区内的文件、去重并重新排序。
+
+    sqlite和parquet存储记录上次导入或导出时CSV文件的修改时间和大小, CSV文件之后被修改(例如中间使用csv存储运行过)时,
+    第一次使用该表前将CSV中的记录合并进来, 主键相同时CSV中的记录优先, 不会丢失csv存储运行时新增的数据。
+    从parquet切换回csv存储前, 先运行compact将分区表导出为CSV。
+"""
+
+import os
+import json
+import sqlite3
+import pandas as pd
+from config import config
+
+
+class TableSpec:
+    """
+    数据表定义
+    :param name: 表名, 本地文件为{name}.csv
+    :param keys: 主键字段, 新数据中出现的主键会替换本地记录
+    :param sort_by: 排序字段, 写入前按该字段倒序排序
+    :param dtypes: 合并前需要转换类型的字段, 如{'时间': 'datetime64[ns]'}
+    :param unique: 主键是否唯一, 唯一时作为数据库表的主键; 不唯一时(如按文章整体替换的分布数据)建立普通索引
+    :param partition_by: 按月分区的日期字段, 必须是主键之一, 保证同一主键的记录总在同一个分区
+    """
+    def __init__(self, name, keys, sort_by, dtypes=None, unique=True, partition_by=None):
+        self.name = name
+        self.keys = list(keys)
+        self.sort_by = sort_by
+        self.dtypes = dtypes or {}
+        self.unique = unique
+        if partition_by is not None and partition_by not in self.keys:
+            raise ValueError(f'{name}: 分区字段 {partition_by} 必须是主键之一')
+        self.partition_by = partition_by
+
+    @property
+    def file_name(self):
+        return f'{self.name}.csv'
+
+    def apply_dtypes(self, df):
+        if not self.dtypes:
+            return df
+        df = df.copy()
+        for column, dtype in self.dtypes.items():
+            if column not in df.columns:
+                continue
+            if str(dtype).startswith('datetime'):
+                df[column] = pd.to_datetime(df[column])
+            else:
+                df[column] = df[column].astype(dtype)
+        return df
+
+
+# 分析结果的所有数据表
+TABLES = {spec.name: spec for spec in [
+    # 流量分析: 渠道为"全部"的汇总数据, 和各渠道数据
+    TableSpec('traffic_summary', ['日期'], '日期', partition_by='日期'),
+    TableSpec('traffic', ['日期', '渠道'], '日期', partition_by='日期'),
+    # 已通知和未开启通知内容发表后7日的数据
+    # 已发布和未发布的文章可能同名, 同名的记录整体替换
+    TableSpec('article_7d', ['内容标题'], '发表时间', unique=False),
+    # 文章详情, 分布数据每篇文章有多行, 按文章整体替换
+    TableSpec('article_detail', ['文章标题'], '发表日期'),
+    # 趋势明细每个日期按传播渠道有多行, 同一文章同一日期的记录整体替换
+    TableSpec('article_trend_detail', ['文章标题', '日期'], '日期', unique=False, partition_by='日期'),
+    TableSpec('article_gender_distribution', ['文章标题'], '文章标题', unique=False),
+    TableSpec('article_age_distribution', ['文章标题'], '文章标题', unique=False),
+    TableSpec('article_region_distribution', ['文章标题'], '文章标题', unique=False),
+    # 用户增长
+    TableSpec('user_growth', ['时间'], '时间', dtypes={'时间': 'datetime64[ns]'}, partition_by='时间'),
+]}
+
+
+def anti_join(df, other, keys):
+    """返回df中主键不在other中的行"""
+    if len(keys) == 1:
+        return df[~df[keys[0]].isin(other[keys[0]])]
+    df_keys = pd.MultiIndex.from_frame(df[keys])
+    other_keys = pd.MultiIndex.from_frame(other[keys])
+    return df[~df_keys.isin(other_keys)]
+
+
+def upsert(data_dir, spec, new_data):
+    """
+    将new_data合并到data_dir下的本地文件, 本地文件不存在时直接创建, 合并结果为空时不写入
+    :param spec: TableSpec或表名
+    :return: 合并后的数据
+    """
+    if isinstance(spec, str):
+        spec = TABLES[spec]
+    file_path = data_dir / spec.file_name
+    data = spec.apply_dtypes(new_data)
+    if file_path.exists():
+        local_data = spec.apply_dtypes(pd.read_csv(file_path))
+        local_data = anti_join(local_data, data, spec.keys)
+        data = pd.concat([local_data, data], ignore_index=True)
+    if not data.empty:
+        data = data.sort_values(by=spec.sort_by, ascending=False)
+        data.to_csv(file_path, index=False)
+    return data
+
+
+class CsvTableStore:
+    """每个表保存为一个CSV文件"""
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+
+    def upsert(self, table_name, new_data):
+        upsert(self.data_dir, table_name, new_data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SqliteTableStore:
+    """
+    所有表保存在一个SQLite数据库中, flush时将更新过的表导出为CSV。
+    CSV文件在上次导入或导出后被修改时(例如中间使用csv存储运行过), 第一次使用该表前将CSV中的记录合并到数据库,
+    上次导入或导出时CSV文件的修改时间和大小记录在_csv_sync表中。
+    连接只能在创建它的线程中使用, close后再次使用时重新连接。
+    """
+    db_name = 'wechat_data.db'
+    sync_table = '_csv_sync'
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self._conn = None
+        self.updated_tables = set()
+        self.synced_tables = set()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(str(self.data_dir / self.db_name))
+            with self._conn:
+                self._conn.execute(f'CREATE TABLE IF NOT EXISTS {_quote(self.sync_table)} '
+                                   f'(name PRIMARY KEY, mtime_ns, size)')
+        return self._conn
+
+    def upsert(self, table_name, new_data):
+        spec = TABLES[table_name]
+        data = self._to_sql_values(spec, new_data)
+        if data.empty:
+            return
+        self._ensure_table(spec, data.columns)
+        self._write_rows(spec, data)
+        self.updated_tables.add(spec.name)
+
+    def flush(self):
+        """将更新过的表按排序字段倒序导出为CSV"""
+        for table_name in sorted(self.updated_tables):
+            spec = TABLES[table_name]
+            data = pd.read_sql_query(
+                f'SELECT * FROM {_quote(spec.name)} ORDER BY {_quote(spec.sort_by)} DESC', self.conn
+            )
+            csv_path = self.data_dir / spec.file_name
+            data.to_csv(csv_path, index=False)
+            self._mark_synced(spec, csv_path)
+        self.updated_tables.clear()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _table_columns(self, table_name):
+        return [row[1] for row in self.conn.execute(f'PRAGMA table_info({_quote(table_name)})')]
+
+    def _ensure_table(self, spec, columns):
+        """
+        表不存在时创建, 新数据中有表中没有的字段时增加字段, 每个表第一次使用时合并CSV文件中的记录。
+        字段不声明类型, 按写入时的类型保存
+        """
+        first_use = spec.name not in self.synced_tables
+        if first_use:
+            self._check_primary_key(spec)
+        if not self._table_columns(spec.name):
+            column_sql = ', '.join(_quote(column) for column in columns)
+            key_sql = ', '.join(_quote(key) for key in spec.keys)
+            with self.conn:
+                if spec.unique:
+                    self.conn.execute(f'CREATE TABLE {_quote(spec.name)} ({column_sql}, PRIMARY KEY ({key_sql}))')
+                else:
+                    self.conn.execute(f'CREATE TABLE {_quote(spec.name)} ({column_sql})')
+                    self.conn.execute(f'CREATE INDEX {_quote(spec.name + "_keys")} ON {_quote(spec.name)} ({key_sql})')
+        else:
+            self._ensure_columns(spec, columns)
+        if first_use:
+            self.synced_tables.add(spec.name)
+            self._import_csv(spec)
+
+    def _check_primary_key(self, spec):
+        """
+        表的主键与TableSpec.unique不一致时(例如主键不唯一的表按唯一主键创建过), 删除该表,
+        之后重新创建并从CSV文件导入
+        """
+        table_info = list(self.conn.execute(f'PRAGMA table_info({_quote(spec.name)})'))
+        if not table_info:
+            return
+        has_primary_key = any(row[5] for row in table_info)
+        if has_primary_key == spec.unique:
+            return
+        print(f'{spec.name} 的主键定义已变化, 从CSV文件重新导入')
+        with self.conn:
+            self.conn.execute(f'DROP TABLE {_quote(spec.name)}')
+            self.conn.execute(f'DELETE FROM {_quote(self.sync_table)} WHERE name = ?', (spec.name,))
+
+    def _ensure_columns(self, spec, columns):
+        existing_columns = self._table_columns(spec.name)
+        with self.conn:
+            for column in columns:
+                if column not in existing_columns:
+                    self.conn.execute(f'ALTER TABLE {_quote(spec.name)} ADD COLUMN {_quote(column)}')
+
+    def _import_csv(self, spec):
+        """CSV文件在上次导入或导出后被修改时, 将其中的记录合并到数据库, 主键相同时CSV中的记录优先"""
+        csv_path = self.data_dir / spec.file_name
+        if not csv_path.exists():
+            return
+        stat = csv_path.stat()
+        synced = self.conn.execute(
+            f'SELECT mtime_ns, size FROM {_quote(self.sync_table)} WHERE name = ?', (spec.name,)
+        ).fetchone()
+        if synced == (stat.st_mtime_ns, stat.st_size):
+            return
+        history = self._to_sql_values(spec, pd.read_csv(csv_path))
+        if not history.empty:
+            self._ensure_columns(spec, history.columns)
+            self._write_rows(spec, history)
+            if synced is not None:
+                print(f'{csv_path} 在上次导出后被修改, 已将其中的记录合并到数据库')
+        self._mark_synced(spec, csv_path)
+
+    def _mark_synced(self, spec, csv_path):
+        stat = csv_path.stat()
+        with self.conn:
+            self.conn.execute(
+                f'INSERT OR REPLACE INTO {_quote(self.sync_table)} (name, mtime_ns, size) VALUES (?, ?, ?)',
+                (spec.name, stat.st_mtime_ns, stat.st_size),
+            )
+
+    def _write_rows(self, spec, data):
+        """主键唯一的表使用INSERT ... ON CONFLICT DO UPDATE, 其它表按主键删除后插入"""
+        columns = list(data.columns)
+        column_sql = ', '.join(_quote(column) for column in columns)
+        placeholders = ', '.join('?' for _ in columns)
+        insert_sql = f'INSERT INTO {_quote(spec.name)} ({column_sql}) VALUES ({placeholders})'
+        with self.conn:
+            if spec.unique:
+                # 同一批数据中主键重复时保留最后一条
+                data = data.drop_duplicates(subset=spec.keys, keep='last')
+                updates = [column for column in columns if column not in spec.keys]
+                conflict_sql = ', '.join(_quote(key) for key in spec.keys)
+                if updates:
+                    update_sql = ', '.join(f'{_quote(column)} = excluded.{_quote(column)}' for column in updates)
+                    insert_sql += f' ON CONFLICT ({conflict_sql}) DO UPDATE SET {update_sql}'
+                else:
+                    insert_sql += f' ON CONFLICT ({conflict_sql}) DO NOTHING'
+            else:
+                where_sql = ' AND '.join(f'{_quote(key)} IS ?' for key in spec.keys)
+                self.conn.executemany(
+                    f'DELETE FROM {_quote(spec.name)} WHERE {where_sql}',
+                    data[spec.keys].drop_duplicates().itertuples(index=False, name=None),
+                )
+            self.conn.executemany(insert_sql, data.itertuples(index=False, name=None))
+
+    @staticmethod
+    def _to_sql_values(spec, df):
+        """转换为SQLite可以保存的值: 日期转换为字符串, 空值转换为None, numpy类型转换为Python类型"""
+        df = spec.apply_dtypes(df).copy()
+        df.columns = [str(column) for column in df.columns]
+        for column in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[column]):
+                values = df[column]
+                date_format = '%Y-%m-%d' if (values.dropna() == values.dropna().dt.normalize()).all() else '%Y-%m-%d %H:%M:%S'
+                df[column] = values.dt.strftime(date_format)
+        df = df.astype(object).where(df.notna(), None)
+        return df
+
+
+class ParquetTableStore:
+    """
+    按月分区的Parquet存储: {data_dir}/parquet/{表名}/month=YYYY-MM/data.parquet
+    只保存定义了partition_by的表, 其它表交给CsvTableStore。
+    CSV文件在上次导入或导出后被修改时, 第一次写入该表前将CSV中的记录按月合并到分区,
+    上次导入或导出时CSV文件的修改时间和大小记录在{表名}/_csv_sync.json中。
+    """
+    file_name = 'data.parquet'
+    sync_file_name = '_csv_sync.json'
+
+    def __init__(self, data_dir):
+        _require_pyarrow()
+        self.data_dir = data_dir
+        self.root = data_dir / 'parquet'
+        self.csv_store = CsvTableStore(data_dir)
+        self.synced_tables = set()
+
+    def upsert(self, table_name, new_data):
+        spec = TABLES[table_name]
+        if spec.partition_by is None:
+            return self.csv_store.upsert(table_name, new_data)
+        data = spec.apply_dtypes(new_data)
+        if data.empty:
+            return
+        self._import_csv(spec)
+        self._merge(spec, data)
+
+    def _merge(self, spec, data):
+        """主键包含分区字段, 只需要与同一个月份的分区合并, data中的记录优先"""
+        for month, month_data in data.groupby(self._months(spec, data), sort=False):
+            path = self._partition_dir(spec, month) / self.file_name
+            if path.exists():
+                local_data = spec.apply_dtypes(pd.read_parquet(path))
+                month_data = pd.concat([anti_join(local_data, month_data, spec.keys), month_data], ignore_index=True)
+            self._write_partition(spec, path, month_data)
+
+    def read_table(self, table_name, columns=None, begin=None, end=None):
+        """
+        读取表数据, 只读取需要的字段和月份
+        :param columns: 需要读取的字段, 默认读取全部字段
+        :param begin: 开始日期(包含), 格式YYYY-MM-DD, 用于跳过其它月份的分区并在分区内过滤
+        :param end: 结束日期(包含)
+        """
+        spec = TABLES[table_name]
+        if spec.partition_by is None:
+            csv_path = self.data_dir / spec.file_name
+            return pd.read_csv(csv_path, usecols=columns) if csv_path.exists() else pd.DataFrame(columns=columns)
+        frames = []
+        for path in self._partition_files(spec, begin, end):
+            frames.append(pd.read_parquet(path, columns=columns, filters=self._filters(spec, path, begin, end)))
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        data = pd.concat(frames, ignore_index=True)
+        if spec.sort_by in data.columns:
+            data = data.sort_values(by=spec.sort_by, ascending=False)
+        return data
+
+    def flush(self):
+        """分区表不在每次处理后导出CSV, 避免每次运行都读取全部分区并重写完整的历史文件"""
+        self.csv_store.flush()
+
+    def close(self):
+        self.csv_store.close()
+
+    def export_csv(self, target_dir=None):
+        """
+        将分区表导出为CSV, 目标文件不早于所有分区文件时跳过
+        :param target_dir: 导出目录, 默认为本地数据目录, 导出到本地数据目录时同时更新CSV同步记录
+        :return: 已导出或无需导出的CSV文件名
+        """
+        target_dir = target_dir or self.data_dir
+        exported = set()
+        for spec in TABLES.values():
+            if spec.partition_by is None:
+                continue
+            # 导出前合并CSV中的记录, 避免用旧的分区数据覆盖csv存储运行时新增的数据
+            self._import_csv(spec)
+            files = self._partition_files(spec)
+            if not files:
+                continue
+            target_path = target_dir / spec.file_name
+            exported.add(spec.file_name)
+            latest = max(path.stat().st_mtime_ns for path in files)
+            if target_path.exists() and target_path.stat().st_mtime_ns >= latest:
+                continue
+            target_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = target_path.with_suffix('.tmp')
+            self.read_table(spec.name).to_csv(tmp_path, index=False)
+            os.replace(tmp_path, target_path)
+            if target_dir == self.data_dir:
+                self._mark_synced(spec)
+        return exported
+
+    def compact(self):
+        """
+        整理所有分区表: 导入CSV中新增的记录, 合并每个分区内的多个文件, 后写入的文件中的主键替换之前的记录,
+        主键唯一的表同时去重, 排序后重写, 删除空分区, 最后将分区表导出为本地CSV文件
+        :return: {表名: (分区数, 行数)}
+        """
+        result = {}
+        for spec in TABLES.values():
+            if spec.partition_by is None:
+                continue
+            self._import_csv(spec)
+            table_dir = self.root / spec.name
+            if not table_dir.exists():
+                continue
+            partitions = rows = 0
+            for partition_dir in sorted(table_dir.glob('month=*')):
+                # 按修改时间排序, 后写入的文件中出现的主键替换之前文件中的记录, 与upsert一致
+                files = sorted(partition_dir.glob('*.parquet'), key=lambda path: path.stat().st_mtime)
+                data = pd.DataFrame()
+                for path in files:
+                    file_data = spec.apply_dtypes(pd.read_parquet(path))
+                    if spec.unique:
+                        file_data = file_data.drop_duplicates(subset=spec.keys, keep='last')
+                    if not data.empty:
+                        file_data = pd.concat([anti_join(data, file_data, spec.keys), file_data], ignore_index=True)
+                    data = file_data
+                if data.empty:
+                    for path in files:
+                        path.unlink()
+                    partition_dir.rmdir()
+                    continue
+                self._write_partition(spec, partition_dir / self.file_name, data)
+                for path in files:
+                    if path.name != self.file_name:
+                        path.unlink()
+                partitions += 1
+                rows += len(data)
+            result[spec.name] = (partitions, rows)
+        self.export_csv()
+        return result
+
+    def _partition_dir(self, spec, month):
+        return self.root / spec.name / f'month={month}'
+
+    def _partition_files(self, spec, begin=None, end=None):
+        """按月份跳过不需要的分区"""
+        table_dir = self.root / spec.name
+        if not table_dir.exists():
+            return []
+        begin_month = begin[:7] if begin else None
+        end_month = end[:7] if end else None
+        files = []
+        for partition_dir in sorted(table_dir.glob('month=*')):
+            month = partition_dir.name.split('=', 1)[1]
+            if month != 'unknown':
+                if begin_month and month < begin_month or end_month and month > end_month:
+                    continue
+            files.extend(sorted(partition_dir.glob('*.parquet')))
+        return files
+
+    @staticmethod
+    def _filters(spec, path, begin, end):
+        """分区内按日期过滤的条件, 日期字段为时间类型时使用时间比较"""
+        if not begin and not end:
+            return None
+        import pyarrow.parquet as pq
+        field_type = str(pq.read_schema(path).field(spec.partition_by).type)
+        filters = []
+        if field_type.startswith('timestamp'):
+            if begin:
+                filters.append((spec.partition_by, '>=', pd.Timestamp(begin)))
+            if end:
+                filters.append((spec.partition_by, '<', pd.Timestamp(end) + pd.Timedelta(days=1)))
+        else:
+            if begin:
+                filters.append((spec.partition_by, '>=', str(begin)))
+            if end:
+                filters.append((spec.partition_by, '<=', str(end)))
+        return filters
+
+    @staticmethod
+    def _months(spec, data):
+        months = pd.to_datetime(data[spec.partition_by], errors='coerce').dt.strftime('%Y-%m')
+        return months.fillna('unknown')
+
+    def _import_csv(self, spec):
+        """CSV文件在上次导入或导出后被修改时, 将其中的记录按月合并到分区, 主键相同时CSV中的记录优先"""
+        if spec.name in self.synced_tables:
+            return
+        self.synced_tables.add(spec.name)
+        csv_path = self.data_dir / spec.file_name
+        if not csv_path.exists():
+            return
+        sync_path = self.root / spec.name / self.sync_file_name
+        synced = json.loads(sync_path.read_text(encoding='utf-8')) if sync_path.exists() else None
+        stat = csv_path.stat()
+        if synced == {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}:
+            return
+        history = spec.apply_dtypes(pd.read_csv(csv_path))
+        if not history.empty:
+            self._merge(spec, history)
+            if synced is not None:
+                print(f'{csv_path} 在上次导出后被修改, 已将其中的记录合并到分区')
+        self._mark_synced(spec)
+
+    def _mark_synced(self, spec):
+        stat = (self.data_dir / spec.file_name).stat()
+        sync_path = self.root / spec.name / self.sync_file_name
+        sync_path.parent.mkdir(parents=True, exist_ok=True)
+        sync_path.write_text(json.dumps({'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}), encoding='utf-8')
+
+    @staticmethod
+    def _write_partition(spec, path, data):
+        """排序后先写入临时文件再替换, 避免写入中断时损坏分区"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = data.copy()
+        # 同一字段中混有数字和文字时, Parquet无法确定类型, 统一转换为文字
+        for column in data.select_dtypes(include='object').columns:
+            types = data[column].dropna().map(type)
+            if types.nunique() > 1:
+                data[column] = data[column].map(lambda value: value if pd.isna(value) else str(value))
+        data = data.sort_values(by=spec.sort_by, ascending=False)
+        tmp_path = path.with_suffix('.tmp')
+        data.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError('parquet存储需要安装pyarrow: pip install pyarrow')
+
+
+def _quote(name):
+    """SQLite标识符加双引号, 字段名为中文"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def create_store(data_dir, backend=None):
+    """根据配置WECHAT_DATA_BACKEND创建数据存储"""
+    backend = backend or config.wechat_data_backend
+    if backend == 'csv':
+        return CsvTableStore(data_dir)
+    if backend == 'sqlite':
+        return SqliteTableStore(data_dir)
+    if backend == 'parquet':
+        return ParquetTableStore(data_dir)
+    raise ValueError(f'不支持的数据存储: {backend}')
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    此文件的主要功能是直接通过HTTP请求下载微信公众号后台的导出文件, 不再通过页面点击完成下载。
+    1. 复用登录后保存的storage state(tmp/session/wechat/wechat_session.json)中的cookie
+    2. 请求后台首页, 从跳转后的链接中获取token
+    3. 使用同一个请求上下文(连接池)并发请求导出接口, 保存导出文件
+    导出接口的链接与后台页面中"下载数据明细"/"下载表格"链接一致, 后台改版导致接口失败时,
+    WechatDataFetcher会回退到页面点击的方式下载。
+    base_url可以指向本地的模拟服务, 用于测试。
+"""
+
+import re
+import random
+import asyncio
+from pathlib import Path
+from playwright.async_api import async_playwright, Error as PlaywrightError
+from config import config
+
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
+    'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:54.0) Gecko/20100101 Firefox/54.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_12_6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/61.0.3163.100 Safari/537.36'
+]
+
+# 导出接口, 参数: begin_date, end_date(YYYY-MM-DD), token
+EXPORT_ENDPOINTS = {
+    # 内容分析 - 流量分析
+    'traffic': '/misc/appmsganalysis?action=report&type=daily&begin_date={begin_date}&end_date={end_date}'
+               '&download=1&token={token}&lang=zh_CN',
+    # 内容分析 - 已通知内容
+    'article_7d': '/misc/appmsganalysis?action=msgstat&begin_date={begin_date}&end_date={end_date}'
+                  '&download=1&token={token}&lang=zh_CN',
+    # 内容分析 - 未开启通知内容
+    'unpub_article_7d': '/misc/appmsganalysis?action=msgstat&msg_type=unnotify&begin_date={begin_date}'
+                        '&end_date={end_date}&download=1&token={token}&lang=zh_CN',
+    # 用户分析 - 用户增长
+    'user_growth': '/misc/useranalysis?begin_date={begin_date}&end_date={end_date}&source=99999999'
+                   '&download=1&token={token}&lang=zh_CN',
+}
+
+
+class ExportError(Exception):
+    """导出接口请求失败(包括连接失败、超时), 或返回的不是导出文件"""
+
+
+class SessionExpiredError(ExportError):
+    """登录状态失效, 无法获取token"""
+
+
+class WechatExportClient:
+    """
+    微信后台导出文件的HTTP客户端, 基于Playwright的APIRequestContext, 不需要启动浏览器。
+
+    使用示例:
+    ```python
+    async with WechatExportClient(session_path) as client:
+        results = await client.download_many([
+            ('traffic', {'begin_date': '2025-01-01', 'end_date': '2025-01-31'}, 'tmp/data/wechat/traffic_data.xlsx'),
+        ])
+    ```
+    """
+    def __init__(self, session_path, base_url=None, concurrency=None, timeout=60):
+        self.session_path = Path(session_path)
+        self.base_url = (base_url or config.wechat_mp_base_url).rstrip('/')
+        self.concurrency = concurrency or config.wechat_http_concurrency
+        self.timeout = timeout * 1000
+        self.playwright = None
+        self.request = None
+        self.token = None
+
+    async def start(self):
+        if not self.session_path.exists():
+            raise SessionExpiredError(f'登录状态文件不存在: {self.session_path}')
+        self.playwright = await async_playwright().start()
+        try:
+            self.request = await self.playwright.request.new_context(
+                base_url=self.base_url,
+                storage_state=str(self.session_path),
+                extra_http_headers={'User-Agent': random.choice(USER_AGENTS), 'Referer': self.base_url + '/'},
+                timeout=self.timeout,
+            )
+        except PlaywrightError as e:
+            raise ExportError(f'创建请求上下文失败: {e}') from e
+        self.token = await self.fetch_token()
+
+    async def close(self):
+        if self.request is not None:
+            await self.request.dispose()
+            self.request = None
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+
+    async def __aenter__(self):
+        try:
+            await self.start()
+        except BaseException:
+            # 启动失败时不会调用__aexit__, 在这里释放已创建的资源
+            await self.close()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+        return False
+
+    async def _get(self, url):
+        """GET请求, 连接失败、超时等传输错误转换为ExportError"""
+        try:
+            return await self.request.get(url)
+        except PlaywrightError as e:
+            raise ExportError(f'请求失败 {self.base_url}{url}: {e}') from e
+
+    async def fetch_token(self):
+        """已登录时请求后台首页会跳转到带token的链接, 未登录时停留在登录页"""
+        response = await self._get('/')
+        match = re.search(r'[?&]token=(\d+)', response.url)
+        if not match:
+            raise SessionExpiredError('登录状态已失效, 未获取到token')
+        return match.group(1)
+
+    async def download(self, name, params, path):
+        """
+        请求导出接口并保存文件
+        :param name: EXPORT_ENDPOINTS中的接口名称
+        :param params: 接口参数, begin_date和end_date
+        :param path: 保存路径
+        """
+        url = EXPORT_ENDPOINTS[name].format(token=self.token, **params)
+        response = await self._get(url)
+        if response.status != 200:
+            raise ExportError(f'{name} 导出失败, 状态码 {response.status}')
+        # 导出文件以附件形式返回, 返回页面说明请求参数错误或登录失效
+        disposition = response.headers.get('content-disposition', '')
+        if 'attachment' not in disposition:
+            raise ExportError(f'{name} 导出失败, 返回的不是导出文件')
+        try:
+            body = await response.body()
+        except PlaywrightError as e:
+            raise ExportError(f'{name} 导出失败, 读取导出文件出错: {e}') from e
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(body)
+        return path
+
+    async def download_many(self, jobs):
+        """
+        并发下载多个导出文件, 单个文件失败不影响其它文件
+        :param jobs: [(name, params, path), ...]
+        :return: 与jobs一一对应的列表, 元素为文件路径或异常
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_job(name, params, path):
+            async with semaphore:
+                return await self.download(name, params, path)
+
+        return await asyncio.gather(*[run_job(*job) for job in jobs], return_exceptions=True)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    微信公众号后台登录状态的检查工具。
+    1. check_session: 使用保存的storage state直接请求后台首页, 不启动浏览器, 已登录时返回token
+    2. session_expires_at / warn_session_expiry: 读取登录cookie的过期时间, 即将过期时提前提示重新扫码登录
+"""
+
+import re
+import json
+import pendulum
+from pathlib import Path
+from config import config
+
+
+# 后台登录相关的cookie, 其中最早过期的时间即为登录状态的过期时间
+SESSION_COOKIES = ('slave_sid', 'slave_user', 'data_ticket', 'bizuin')
+
+
+def check_session(playwright, session_path, base_url=None, user_agent=None):
+    """
+    使用storage state请求后台首页, 已登录时会跳转到带token的链接
+    :param playwright: 同步版Playwright实例
+    :return: token, 登录状态文件不存在或已失效时返回None
+    """
+    session_path = Path(session_path)
+    if not session_path.exists():
+        return None
+    base_url = (base_url or config.wechat_mp_base_url).rstrip('/')
+    headers = {'User-Agent': user_agent} if user_agent else None
+    request = playwright.request.new_context(
+        base_url=base_url, storage_state=str(session_path), extra_http_headers=headers, timeout=15000
+    )
+    try:
+        response = request.get('/')
+        match = re.search(r'[?&]token=(\d+)', response.url)
+        return match.group(1) if match else None
+    except Exception as e:
+        print(f'检查登录状态失败: {e}')
+        return None
+    finally:
+        request.dispose()
+
+
+def session_expires_at(session_path):
+    """
+    登录cookie中最早的过期时间
+    :return: pendulum.DateTime, 文件不存在或cookie没有过期时间时返回None
+    """
+    session_path = Path(session_path)
+    if not session_path.exists():
+        return None
+    try:
+        cookies = json.loads(session_path.read_text(encoding='utf-8')).get('cookies', [])
+    except json.JSONDecodeError:
+        return None
+    expires = [cookie['expires'] for cookie in cookies
+               if cookie.get('name') in SESSION_COOKIES and cookie.get('expires', -1) > 0]
+    if not expires:
+        return None
+    return pendulum.from_timestamp(min(expires), tz='local')
+
+
+def warn_session_expiry(session_path, hours=None):
+    """登录状态将在hours小时内过期时提示, 返回过期时间"""
+    hours = config.wechat_session_warn_hours if hours is None else hours
+    expires_at = session_expires_at(session_path)
+    if expires_at is not None and expires_at <= pendulum.now().add(hours=hours):
+        print(f"登录状态将于 {expires_at.format('YYYY-MM-DD HH:mm')} 过期, 请在此之前运行一次并扫码登录")
+    return expires_at
@@ -5,8 +5,79 @@ import os
 # CONFIG_ITEM = 'value'
 load_dotenv()
 
+
+def _env_list(name, default=''):
+    """读取逗号分隔的环境变量, 返回去掉空项的列表"""
+    value = os.environ.get(name, default)
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
 root_dir = os.environ.get('ROOT_DIR')
 parallel_num = int(os.environ.get('PARALLEL_NUM'))
 
+# 文章爬虫
+# 浏览器配置: desktop(有界面) | server(无界面)
+crawler_profile = os.environ.get('CRAWLER_PROFILE', 'desktop')
+# 并发上限, 实际并发数从PARALLEL_NUM开始, 根据耗时和失败率在1到上限之间自动调整
+crawler_max_parallel_num = int(os.environ.get('CRAWLER_MAX_PARALLEL_NUM', parallel_num * 4))
+# 单篇文章的目标耗时(秒), 平均耗时超过该值时不再增加并发
+crawler_target_latency = float(os.environ.get('CRAWLER_TARGET_LATENCY', 30))
+# 每个域名每秒请求数和突发请求数
+crawler_host_rate = float(os.environ.get('CRAWLER_HOST_RATE', 2))
+crawler_host_burst = int(os.environ.get('CRAWLER_HOST_BURST', 5))
+# 爬虫进程数, 大于1时开启多进程模式, 并发上限平分给各进程, 域名限速由全部进程共用
+crawler_process_num = int(os.environ.get('CRAWLER_PROCESS_NUM', 1))
+# 单个页面使用多少次后回收重建
+crawler_page_max_uses = int(os.environ.get('CRAWLER_PAGE_MAX_USES', 50))
+# 输出格式: pdf | html | markdown | text
+crawler_output_format = os.environ.get('CRAWLER_OUTPUT_FORMAT', 'pdf')
+# 图片加载方式: fast(直接触发懒加载并等待图片完成) | scroll(逐步滚动页面)
+crawler_load_mode = os.environ.get('CRAWLER_LOAD_MODE', 'fast')
+# fast模式下等待图片加载和网络空闲的超时时间(毫秒)
+crawler_image_timeout = int(os.environ.get('CRAWLER_IMAGE_TIMEOUT', 15000))
+# 请求拦截: 按资源类型拦截, 按url正则拦截, 按url正则放行(优先于拦截)
+crawler_block_resource_types = _env_list('CRAWLER_BLOCK_RESOURCE_TYPES', 'media,font')
+crawler_block_url_patterns = _env_list(
+    'CRAWLER_BLOCK_URL_PATTERNS',
+    r'mp\.weixin\.qq\.com/mp/(appmsgreport|jsmonitor|getappmsgext|appmsg_comment|relatedarticle|videoplayer|getbizbanner),'
+    r'badjs\.,report\.url\.cn,btrace\.qq\.com,aegis\.qq\.com,v\.qq\.com,vpic\.video\.qq\.com'
+)
+crawler_allow_url_patterns = _env_list('CRAWLER_ALLOW_URL_PATTERNS')
+# 静态资源磁盘缓存: 缓存大小上限(MB, 0表示关闭), 需要缓存的域名
+crawler_asset_cache_mb = int(os.environ.get('CRAWLER_ASSET_CACHE_MB', 1024))
+crawler_asset_cache_hosts = _env_list('CRAWLER_ASSET_CACHE_HOSTS', 'mmbiz.qpic.cn,res.wx.qq.com')
+
 # Wechat
-wechat_opt_data_dir = os.environ.get('WECHAT_OPT_DATA_DIR')
\ No newline at end of file
+wechat_opt_data_dir = os.environ.get('WECHAT_OPT_DATA_DIR')
+# 运营数据下载方式: ui(页面点击) | http(直接请求导出接口, 失败时回退到页面点击)
+wechat_fetch_engine = os.environ.get('WECHAT_FETCH_ENGINE', 'ui')
+# 公众号后台地址, 测试时可以指向本地模拟服务
+wechat_mp_base_url = os.environ.get('WECHAT_MP_BASE_URL', 'https://mp.weixin.qq.com')
+# HTTP导出的并发请求数
+wechat_http_concurrency = int(os.environ.get('WECHAT_HTTP_CONCURRENCY', 4))
+# 文章详情数据的并发下载标签页数, 1表示逐个点击下载
+wechat_detail_concurrency = int(os.environ.get('WECHAT_DETAIL_CONCURRENCY', 1))
+# 后台操作的节奏: human(模拟人工操作, 随机等待) | fast(只等待元素、网络空闲和下载事件)
+wechat_pacing_mode = os.environ.get('WECHAT_PACING_MODE', 'human')
+# human模式下随机等待的总时长上限(秒), 用完后按fast模式执行, 0表示不限制
+wechat_pacing_budget = float(os.environ.get('WECHAT_PACING_BUDGET', 0))
+# 多账号运行: 账号配置名称列表(逗号分隔), 同时运行的账号数
+wechat_accounts = _env_list('WECHAT_ACCOUNTS')
+wechat_account_process_num = int(os.environ.get('WECHAT_ACCOUNT_PROCESS_NUM', 3))
+# 数据处理方式: batch(全部下载完成后处理) | pipeline(边下载边处理)
+wechat_process_mode = os.environ.get('WECHAT_PROCESS_MODE', 'batch')
+# 登录状态有效时使用无头浏览器
+wechat_warm_headless = os.environ.get('WECHAT_WARM_HEADLESS', 'true').lower() in ('1', 'true', 'yes')
+# 运行过程中保存登录状态的间隔(秒), 登录状态在多少小时内过期时提示
+wechat_session_refresh_interval = int(os.environ.get('WECHAT_SESSION_REFRESH_INTERVAL', 300))
+wechat_session_warn_hours = int(os.environ.get('WECHAT_SESSION_WARN_HOURS', 24))
+# 记录各阶段耗时到tmp/traces, 运行结束时打印汇总表
+wechat_trace = os.environ.get('WECHAT_TRACE', 'true').lower() in ('1', 'true', 'yes')
+# 运营数据的存储: csv(每个表一个CSV文件) | sqlite(SQLite数据库) | parquet(按日期的表按月分区, 需要安装pyarrow)
+# sqlite和parquet在处理完成后导出CSV
+wechat_data_backend = os.environ.get('WECHAT_DATA_BACKEND', 'csv')
+# 解析文章详情文件的进程数, 1表示在当前进程中逐个解析
+# 多账号运行时每个账号各有一个进程池, 默认使用较小的进程数
+wechat_parse_workers = int(os.environ.get('WECHAT_PARSE_WORKERS', 2))
+# 文章详情文件少于该数量时在当前进程中解析, 启动子进程并重新导入pandas的开销超过并行节省的时间
+wechat_parse_min_files = int(os.environ.get('WECHAT_PARSE_MIN_FILES', 10))
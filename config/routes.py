@@ -1,5 +1,7 @@
 routes = [
-    ('wechat-file-2-pdf', 'business.services.wechat_content_crawler.run', '根据Excel文件中的链接爬取微信公众号文章，并保存为PDF文件。'),
-    ('wx-data-fetch', 'business.apps.wechat_data_crawler.run', '调用wechat_data_crawler.py中的run方法，接收可选参数begin_date和end_date，用于指定要下载的日期范围。'),
-    ('wx-data-pub', 'business.apps.wechat_data_crawler.publish_wechat_data', '执行微信数据发布功能，接收account_name参数')
+    ('wechat-file-2-pdf', 'business.services.wechat_content_crawler.run', '根据Excel文件中的链接爬取微信公众号文章，并保存为PDF文件。接收可选参数input_path, output_path和output_format(pdf/html/markdown/text)。'),
+    ('wx-data-fetch', 'business.apps.wechat_data_crawler.run', '调用wechat_data_crawler.py中的run方法，接收可选参数begin_date和end_date，用于指定要下载的日期范围，可选参数pacing(human/fast)指定后台操作的等待模式，可选参数profile指定使用独立登录状态和下载目录的账号配置。'),
+    ('wx-data-fetch-all', 'business.apps.wechat_data_crawler.run_accounts', '多个账号同时下载和处理微信公众号数据，每个账号使用独立的登录状态和下载目录。接收可选参数profiles(逗号分隔的账号配置名称，默认读取WECHAT_ACCOUNTS)、begin_date、end_date和pacing。'),
+    ('wx-data-pub', 'business.apps.wechat_data_crawler.publish_wechat_data', '执行微信数据发布功能，接收account_name参数'),
+    ('wx-data-compact', 'business.apps.wechat_data_crawler.compact_wechat_data', '整理微信运营数据的Parquet分区(合并文件、去重、排序)并导出CSV，接收account_name参数')
 ]
\ No newline at end of file
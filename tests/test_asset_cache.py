@@ -0,0 +1,57 @@
+import os
+import json
+import tempfile
+import unittest
+import multiprocessing
+from pathlib import Path
+
+# 导入config之前准备好必需的环境变量
+os.environ.setdefault('ROOT_DIR', tempfile.mkdtemp())
+os.environ.setdefault('PARALLEL_NUM', '3')
+
+from tools.asset_cache import AssetCache
+
+
+"""
+    多个进程共用同一个缓存目录时, 索引合并不丢失其它进程写入的资源;
+    运行中定期淘汰, 不等到运行结束缓存大小也不超过上限。
+"""
+
+
+def put_assets(cache_dir, worker, count):
+    cache = AssetCache(cache_dir, max_bytes=1024 * 1024, hosts=[], save_every=5).load()
+    for i in range(count):
+        cache.put(f'https://mmbiz.qpic.cn/{worker}/{i}.png', f'{worker}-{i}'.encode('utf-8'), 'image/png')
+    cache.save()
+
+
+class AssetCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = Path(tempfile.mkdtemp())
+
+    def read_index(self):
+        return json.loads((self.cache_dir / 'index.json').read_text(encoding='utf-8'))
+
+    def test_concurrent_save_keeps_every_entry(self):
+        ctx = multiprocessing.get_context('spawn')
+        workers = [ctx.Process(target=put_assets, args=(str(self.cache_dir), worker, 40)) for worker in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(len(self.read_index()), 3 * 40)
+        self.assertEqual(list(self.cache_dir.glob('*.tmp')), [])
+
+    def test_evict_during_run(self):
+        cache = AssetCache(self.cache_dir, max_bytes=100, hosts=[], save_every=5).load()
+        for i in range(50):
+            cache.put(f'https://mmbiz.qpic.cn/{i}.png', bytes([i]) * 10, 'image/png')
+        # 没有调用save, 磁盘上的缓存已经按上限淘汰
+        blobs = list((self.cache_dir / 'blobs').iterdir())
+        self.assertLessEqual(sum(blob.stat().st_size for blob in blobs), 100 + 5 * 10)
+        self.assertIn('https://mmbiz.qpic.cn/44.png', self.read_index())
+
+
+if __name__ == '__main__':
+    unittest.main()
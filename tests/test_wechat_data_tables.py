@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+# 导入config之前准备好必需的环境变量
+os.environ.setdefault('ROOT_DIR', tempfile.mkdtemp())
+os.environ.setdefault('PARALLEL_NUM', '3')
+
+import pandas as pd
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    pyarrow = None
+from business.services.wechat_data_tables import TABLES, CsvTableStore, SqliteTableStore, ParquetTableStore
+
+
+"""
+    数据存储的合并结果与CSV存储一致。
+    趋势明细每个(文章标题, 日期)按传播渠道有多行, 合并时整体替换, 不能只保留一个渠道。
+"""
+
+CHANNELS = ['公众号消息', '推荐', '朋友圈']
+
+
+def trend_rows(title, dates, reads=1):
+    return pd.DataFrame([
+        {'日期': date, '传播渠道': channel, '阅读人数': reads, '阅读次数': reads * 2, '文章标题': title}
+        for date in dates for channel in CHANNELS
+    ])
+
+
+def read_csv(data_dir, table_name):
+    data = pd.read_csv(data_dir / TABLES[table_name].file_name)
+    return data.sort_values(list(data.columns)).reset_index(drop=True)
+
+
+class SqliteTableStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.csv_dir = Path(tempfile.mkdtemp())
+        self.sqlite_dir = Path(tempfile.mkdtemp())
+
+    def upsert_both(self, table_name, data):
+        CsvTableStore(self.csv_dir).upsert(table_name, data)
+        store = SqliteTableStore(self.sqlite_dir)
+        store.upsert(table_name, data)
+        store.flush()
+        store.close()
+
+    def test_trend_keeps_every_channel(self):
+        self.upsert_both('article_trend_detail', trend_rows('文章A', ['2025-01-01', '2025-01-02']))
+        # 再次下载时同一日期的数据整体替换
+        self.upsert_both('article_trend_detail', trend_rows('文章A', ['2025-01-02', '2025-01-03'], reads=5))
+        sqlite_data = read_csv(self.sqlite_dir, 'article_trend_detail')
+        self.assertEqual(len(sqlite_data), 3 * len(CHANNELS))
+        pd.testing.assert_frame_equal(sqlite_data, read_csv(self.csv_dir, 'article_trend_detail'))
+
+    def test_import_csv_keeps_every_channel(self):
+        CsvTableStore(self.sqlite_dir).upsert('article_trend_detail', trend_rows('文章A', ['2025-01-01']))
+        store = SqliteTableStore(self.sqlite_dir)
+        store.upsert('article_trend_detail', trend_rows('文章B', ['2025-01-01']))
+        store.flush()
+        store.close()
+        self.assertEqual(len(read_csv(self.sqlite_dir, 'article_trend_detail')), 2 * len(CHANNELS))
+
+    def test_rebuild_table_with_unique_primary_key(self):
+        """按唯一主键创建过的趋势明细表重新创建, 并从CSV导入"""
+        CsvTableStore(self.sqlite_dir).upsert('article_trend_detail', trend_rows('文章A', ['2025-01-01']))
+        conn = sqlite3.connect(str(self.sqlite_dir / SqliteTableStore.db_name))
+        conn.execute('CREATE TABLE "article_trend_detail" ("日期", "传播渠道", "阅读人数", "阅读次数", "文章标题", '
+                     'PRIMARY KEY ("文章标题", "日期"))')
+        conn.commit()
+        conn.close()
+        store = SqliteTableStore(self.sqlite_dir)
+        store.upsert('article_trend_detail', trend_rows('文章B', ['2025-01-01']))
+        store.flush()
+        store.close()
+        self.assertEqual(len(read_csv(self.sqlite_dir, 'article_trend_detail')), 2 * len(CHANNELS))
+
+
+@unittest.skipIf(pyarrow is None, 'parquet存储需要安装pyarrow')
+class ParquetTableStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.csv_dir = Path(tempfile.mkdtemp())
+        self.parquet_dir = Path(tempfile.mkdtemp())
+
+    def test_compact_keeps_every_channel(self):
+        for data in (trend_rows('文章A', ['2025-01-30', '2025-02-01']),
+                     trend_rows('文章A', ['2025-02-01', '2025-02-02'], reads=5)):
+            CsvTableStore(self.csv_dir).upsert('article_trend_detail', data)
+            ParquetTableStore(self.parquet_dir).upsert('article_trend_detail', data)
+        store = ParquetTableStore(self.parquet_dir)
+        # 分区内有多个文件时, 后写入的文件替换相同主键的全部渠道
+        extra = trend_rows('文章A', ['2025-02-02'], reads=9)
+        extra.to_parquet(self.parquet_dir / 'parquet/article_trend_detail/month=2025-02/extra.parquet', index=False)
+        CsvTableStore(self.csv_dir).upsert('article_trend_detail', extra)
+        result = store.compact()
+        self.assertEqual(result['article_trend_detail'], (2, 3 * len(CHANNELS)))
+        pd.testing.assert_frame_equal(read_csv(self.parquet_dir, 'article_trend_detail'),
+                                      read_csv(self.csv_dir, 'article_trend_detail'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+import os
+import json
+import socket
+import asyncio
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 导入config之前准备好必需的环境变量
+os.environ.setdefault('ROOT_DIR', tempfile.mkdtemp())
+os.environ.setdefault('PARALLEL_NUM', '3')
+
+import pendulum
+from config import config
+from business.services.wechat_export_client import WechatExportClient, ExportError, SessionExpiredError
+from business.services.wechat_data_crawler import WechatDataFetcher
+
+
+"""
+    使用本地模拟的微信后台测试HTTP导出:
+    1. 带登录cookie请求首页时跳转到带token的链接, 没有cookie时停留在登录页
+    2. 导出接口返回附件; 未开启通知内容的导出返回普通页面, 模拟后台改版导致接口失效
+    3. 指向已关闭的端口, 模拟后台无法连接
+"""
+
+TOKEN = '123456'
+SESSION_COOKIE = 'slave_sid=ok'
+EXPORT_BODY = b'PK\x03\x04 fake xlsx'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        logged_in = SESSION_COOKIE in (self.headers.get('Cookie') or '')
+        if url.path == '/':
+            if logged_in:
+                self._send(302, headers={'Location': f'/cgi-bin/home?t=home/index&lang=zh_CN&token={TOKEN}'})
+            else:
+                self._send(200, '<html>登录</html>'.encode('utf-8'), {'Content-Type': 'text/html; charset=utf-8'})
+            return
+        if url.path == '/cgi-bin/home':
+            self._send(200, b'<html>home</html>', {'Content-Type': 'text/html'})
+            return
+        if not logged_in or query.get('token') != [TOKEN]:
+            self._send(200, b'<html>invalid session</html>', {'Content-Type': 'text/html'})
+            return
+        if url.path == '/misc/appmsganalysis' and query.get('msg_type') == ['unnotify']:
+            self._send(200, b'<html>not found</html>', {'Content-Type': 'text/html'})
+            return
+        if url.path in ('/misc/appmsganalysis', '/misc/useranalysis') and query.get('download') == ['1']:
+            file_name = f"{query['begin_date'][0]}_{query['end_date'][0]}.xlsx"
+            self._send(200, EXPORT_BODY, {
+                'Content-Type': 'application/vnd.ms-excel',
+                'Content-Disposition': f'attachment; filename="{file_name}"',
+            })
+            return
+        self._send(404, b'not found')
+
+
+def closed_port_url():
+    """绑定一个空闲端口后立即关闭, 请求该端口时连接被拒绝"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}'
+
+
+class StubServerTestCase(unittest.TestCase):
+    """启动模拟后台, WECHAT_MP_BASE_URL指向该服务"""
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+        cls.patcher = mock.patch.dict(os.environ, {'WECHAT_MP_BASE_URL': cls.base_url})
+        cls.patcher.start()
+        # config在导入时读取环境变量, 同步更新已读取的值
+        cls.config_patcher = mock.patch.object(config, 'wechat_mp_base_url', cls.base_url)
+        cls.config_patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.config_patcher.stop()
+        cls.patcher.stop()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.session_path = self.tmp_dir / 'wechat_session.json'
+        self.write_session(self.session_path, logged_in=True)
+
+    @staticmethod
+    def write_session(path, logged_in):
+        cookies = [{
+            'name': 'slave_sid', 'value': 'ok', 'domain': '127.0.0.1', 'path': '/',
+            'expires': -1, 'httpOnly': True, 'secure': False, 'sameSite': 'Lax',
+        }] if logged_in else []
+        path.write_text(json.dumps({'cookies': cookies, 'origins': []}), encoding='utf-8')
+
+
+class WechatExportClientTest(StubServerTestCase):
+    def run_client(self, func, session_path=None):
+        async def run():
+            async with WechatExportClient(session_path or self.session_path) as client:
+                return await func(client)
+        return asyncio.run(run())
+
+    def test_token_from_redirect(self):
+        async def token(client):
+            return client.token
+        self.assertEqual(self.run_client(token), TOKEN)
+
+    def test_expired_session(self):
+        session_path = self.tmp_dir / 'expired.json'
+        self.write_session(session_path, logged_in=False)
+        with self.assertRaises(SessionExpiredError):
+            self.run_client(lambda client: client.download_many([]), session_path)
+
+    def test_unreachable_server(self):
+        async def run():
+            async with WechatExportClient(self.session_path, base_url=closed_port_url()) as client:
+                return client.token
+        with self.assertRaises(ExportError) as cm:
+            asyncio.run(run())
+        self.assertNotIsInstance(cm.exception, SessionExpiredError)
+
+    def test_missing_session_file(self):
+        with self.assertRaises(SessionExpiredError):
+            self.run_client(lambda client: client.download_many([]), self.tmp_dir / 'missing.json')
+
+    def test_download_attachment(self):
+        params = {'begin_date': '2025-01-01', 'end_date': '2025-01-31'}
+        path = self.tmp_dir / 'traffic.xlsx'
+        result = self.run_client(lambda client: client.download('traffic', params, path))
+        self.assertEqual(result, path)
+        self.assertEqual(path.read_bytes(), EXPORT_BODY)
+
+    def test_download_non_attachment(self):
+        params = {'begin_date': '2025-01-01', 'end_date': '2025-01-31'}
+        path = self.tmp_dir / 'unpub.xlsx'
+        with self.assertRaises(ExportError):
+            self.run_client(lambda client: client.download('unpub_article_7d', params, path))
+        self.assertFalse(path.exists())
+
+    def test_download_many_keeps_going(self):
+        params = {'begin_date': '2025-01-01', 'end_date': '2025-01-31'}
+        jobs = [
+            ('traffic', params, self.tmp_dir / 'traffic.xlsx'),
+            ('unpub_article_7d', params, self.tmp_dir / 'unpub.xlsx'),
+            ('user_growth', params, self.tmp_dir / 'user_growth.xlsx'),
+        ]
+        results = self.run_client(lambda client: client.download_many(jobs))
+        self.assertEqual(results[0], jobs[0][2])
+        self.assertIsInstance(results[1], ExportError)
+        self.assertEqual(results[2], jobs[2][2])
+
+
+class DownloadExportsViaHttpTest(StubServerTestCase):
+    """WechatDataFetcher.download_exports_via_http: 失败的导出单独回退到页面下载"""
+
+    def create_fetcher(self, logged_in=True):
+        fetcher = WechatDataFetcher(begin_date=pendulum.datetime(2025, 1, 1), end_date=pendulum.datetime(2025, 3, 10))
+        fetcher.tmp_data_dir = self.tmp_dir / 'data'
+        fetcher.session_path = self.session_path
+        self.write_session(self.session_path, logged_in)
+        return fetcher
+
+    def test_failed_export_falls_back(self):
+        paths = self.create_fetcher().download_exports_via_http()
+        # 未开启通知内容的接口失效, 不在结果中, 由页面下载
+        self.assertEqual(set(paths), {'traffic', 'article_7d', 'user_growth'})
+        # 超过2个月的日期范围按窗口拆分, 文件名与页面下载一致
+        self.assertEqual([path.name for path in paths['traffic']], [
+            'traffic_data_20250101_20250228.xlsx',
+            'traffic_data_20250301_20250310.xlsx',
+        ])
+        for name_paths in paths.values():
+            for path in name_paths:
+                self.assertEqual(path.read_bytes(), EXPORT_BODY)
+
+    def test_expired_session_falls_back(self):
+        self.assertEqual(self.create_fetcher(logged_in=False).download_exports_via_http(), {})
+
+    def test_unreachable_server_falls_back(self):
+        fetcher = self.create_fetcher()
+        with mock.patch.object(config, 'wechat_mp_base_url', closed_port_url()):
+            self.assertEqual(fetcher.download_exports_via_http(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
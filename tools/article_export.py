@@ -0,0 +1,126 @@
+import re
+import json
+from html import escape
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+
+"""
+    文章导出工具, 将文章正文(#js_content)的HTML导出为清理后的HTML、Markdown或纯文本。
+    与PDF不同, 导出时不需要等待图片加载和渲染。
+"""
+
+# 输出格式及文件后缀
+OUTPUT_FORMATS = {
+    'pdf': 'pdf',
+    'html': 'html',
+    'markdown': 'md',
+    'text': 'txt',
+}
+
+# 纯文本中需要换行的块级标签
+BLOCK_TAGS = ['p', 'section', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'blockquote', 'tr']
+
+# 正文中需要删除的标签
+REMOVE_TAGS = ['script', 'style', 'noscript', 'iframe', 'mpvoice', 'mpvideo', 'mp-common-profile', 'svg']
+
+
+def clean_article_html(html):
+    """
+    清理正文HTML: 删除脚本、样式和嵌入组件, 图片使用data-src中的真实地址, 去掉行内样式。
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup.find_all(REMOVE_TAGS):
+        tag.decompose()
+    for img in soup.find_all('img'):
+        src = img.get('data-src') or img.get('src')
+        img.attrs = {'src': src} if src else {}
+    for tag in soup.find_all(True):
+        for attr in ('style', 'class', 'data-pm-slice', 'data-tool', 'data-darkmode-bgcolor', 'data-darkmode-color'):
+            tag.attrs.pop(attr, None)
+    return soup
+
+
+def html_to_text(soup):
+    """将正文转换为纯文本, 块级标签和换行标签处换行"""
+    for br in soup.find_all('br'):
+        br.replace_with('\n')
+    for tag in soup.find_all(BLOCK_TAGS):
+        tag.insert_before('\n')
+        tag.insert_after('\n')
+    text = soup.get_text()
+    lines = [line.strip() for line in text.splitlines()]
+    return '\n'.join(line for line in lines if line)
+
+
+def html_to_markdown(soup):
+    """将正文转换为Markdown, 只处理文章中常见的标签, 其它标签只保留文字"""
+    def convert(node):
+        if isinstance(node, NavigableString):
+            return re.sub(r'\s+', ' ', str(node))
+        if not isinstance(node, Tag):
+            return ''
+        inner = ''.join(convert(child) for child in node.children)
+        name = node.name
+        if name in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            return f'\n\n{"#" * int(name[1])} {inner.strip()}\n\n'
+        if name in ('p', 'section', 'div'):
+            return f'\n\n{inner.strip()}\n\n' if inner.strip() else ''
+        if name == 'br':
+            return '\n'
+        if name in ('strong', 'b'):
+            return f'**{inner.strip()}**' if inner.strip() else ''
+        if name in ('em', 'i'):
+            return f'*{inner.strip()}*' if inner.strip() else ''
+        if name == 'a':
+            href = node.get('href')
+            return f'[{inner.strip()}]({href})' if href else inner
+        if name == 'img':
+            src = node.get('src')
+            return f'\n\n![]({src})\n\n' if src else ''
+        if name == 'li':
+            return f'\n- {inner.strip()}'
+        if name in ('ul', 'ol'):
+            return f'\n{inner}\n'
+        if name == 'blockquote':
+            lines = [line for line in inner.strip().splitlines() if line.strip()]
+            return '\n\n' + '\n'.join(f'> {line.strip()}' for line in lines) + '\n\n'
+        return inner
+
+    markdown = convert(soup)
+    # 合并多余空行
+    markdown = re.sub(r'\n{3,}', '\n\n', markdown)
+    return markdown.strip()
+
+
+def front_matter(**fields):
+    """
+    生成Markdown的YAML头, 值使用双引号字符串(JSON字符串也是合法的YAML),
+    标题中包含': '、'#'或引号时也不会破坏YAML格式
+    """
+    lines = [f'{name}: {json.dumps(str(value), ensure_ascii=False)}' for name, value in fields.items()]
+    return '---\n' + '\n'.join(lines) + '\n---\n'
+
+
+def render_article(output_format, article_info, content_html):
+    """
+    根据输出格式生成文件内容
+    :param output_format: html | markdown | text
+    :param article_info: 文章信息, 包含title, account, date
+    :param content_html: #js_content的HTML
+    """
+    title, account, date = article_info['title'], article_info['account'], article_info['date']
+    soup = clean_article_html(content_html)
+    if output_format == 'html':
+        title, account, date = escape(title), escape(account), escape(date)
+        return (
+            '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+            f'<title>{title}</title>\n'
+            f'<meta name="author" content="{account}">\n'
+            f'<meta name="date" content="{date}">\n'
+            f'</head>\n<body>\n<h1>{title}</h1>\n{soup}\n</body>\n</html>\n'
+        )
+    if output_format == 'markdown':
+        return f'{front_matter(title=title, account=account, date=date)}\n# {title}\n\n{html_to_markdown(soup)}\n'
+    if output_format == 'text':
+        return f'标题: {title}\n账号: {account}\n日期: {date}\n\n{html_to_text(soup)}\n'
+    raise ValueError(f'不支持的输出格式: {output_format}')
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+from urllib.parse import urlsplit
+from config import config
+from tools.locker import Locker
+
+
+# 命中缓存时不回放的响应头: 内容已由Playwright解码, 长度和编码以缓存的内容为准
+SKIPPED_HEADERS = {'content-length', 'content-encoding', 'transfer-encoding', 'connection', 'set-cookie'}
+
+
+class AssetCache:
+    """
+    文章静态资源的磁盘缓存, 同一账号的文章会重复使用头图、二维码、头像和样式文件。
+    通过Playwright请求拦截提供缓存内容, 命中时直接返回本地文件, 未命中时请求后写入缓存。
+
+    缓存目录结构:
+        blobs/<sha256>  资源内容, 以内容哈希命名, 相同内容只保存一份
+        index.json      url -> {hash, content_type, headers, size, last_used}
+    总大小超过max_bytes时, 按最近使用时间淘汰(LRU)。
+    多个进程可以共用同一个缓存目录: 索引在文件锁内合并后写入, 运行中每写入save_every个资源保存一次并淘汰,
+    缓存大小不会在长时间运行中超过上限太多。
+
+    使用示例:
+    ```python
+    cache = AssetCache().load()
+    await cache.attach(page)
+    ...
+    cache.save()
+    print(cache.summary())
+    ```
+    """
+    def __init__(self, cache_dir=None, max_bytes=None, hosts=None, save_every=200):
+        self.cache_dir = Path(cache_dir or Path(config.root_dir) / 'tmp/cache/wechat_assets')
+        self.blob_dir = self.cache_dir / 'blobs'
+        self.index_path = self.cache_dir / 'index.json'
+        if max_bytes is None:
+            max_bytes = config.crawler_asset_cache_mb * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.hosts = set(hosts if hosts is not None else config.crawler_asset_cache_hosts)
+        self.save_every = save_every
+        # 同一缓存目录的索引合并使用同一个文件锁
+        self.lock_name = f"wechat_assets_{hashlib.md5(str(self.cache_dir.resolve()).encode('utf-8')).hexdigest()[:8]}.lock"
+        self.index = {}
+        self.unsaved_puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.hit_bytes = 0
+
+    def load(self):
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.index = self._read_index()
+        return self
+
+    def _read_index(self):
+        if not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
+    def save(self):
+        """
+        保存索引, 在文件锁内合并磁盘上的索引(其它进程可能同时写入), 然后执行LRU淘汰
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with Locker(self.lock_name, timeout=60):
+            for url, entry in self._read_index().items():
+                local = self.index.get(url)
+                if local is None or local['last_used'] < entry['last_used']:
+                    self.index[url] = entry
+            self.evict()
+            tmp_path = self.index_path.with_name(f'{self.index_path.stem}.{os.getpid()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        self.unsaved_puts = 0
+
+    def evict(self):
+        """按最近使用时间淘汰, 直到总大小不超过max_bytes"""
+        blob_sizes = {entry['hash']: entry['size'] for entry in self.index.values()}
+        total = sum(blob_sizes.values())
+        if total <= self.max_bytes:
+            return
+        for url, entry in sorted(self.index.items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes:
+                break
+            del self.index[url]
+            # 同一内容可能被多个url引用, 没有引用时才删除文件
+            if not any(e['hash'] == entry['hash'] for e in self.index.values()):
+                (self.blob_dir / entry['hash']).unlink(missing_ok=True)
+                total -= entry['size']
+
+    def is_cacheable(self, request):
+        return request.method == 'GET' and urlsplit(request.url).hostname in self.hosts
+
+    def get(self, url):
+        entry = self.index.get(url)
+        if entry is None:
+            return None, None
+        blob_path = self.blob_dir / entry['hash']
+        try:
+            body = blob_path.read_bytes()
+        except FileNotFoundError:
+            del self.index[url]
+            return None, None
+        entry['last_used'] = time.time()
+        return entry, body
+
+    def put(self, url, body, content_type, headers=None):
+        content_hash = hashlib.sha256(body).hexdigest()
+        blob_path = self.blob_dir / content_hash
+        if not blob_path.exists():
+            tmp_path = self.blob_dir / f'{content_hash}.{os.getpid()}.tmp'
+            tmp_path.write_bytes(body)
+            os.replace(tmp_path, blob_path)
+        self.index[url] = {
+            'hash': content_hash,
+            'content_type': content_type,
+            # 原始响应头, 命中时回放, 保留access-control-allow-origin等跨域相关的响应头
+            'headers': {name: value for name, value in (headers or {}).items()
+                        if name.lower() not in SKIPPED_HEADERS},
+            'size': len(body),
+            'last_used': time.time(),
+        }
+        # 运行中定期保存并淘汰, 不等到运行结束
+        self.unsaved_puts += 1
+        if self.save_every and self.unsaved_puts >= self.save_every:
+            self.save()
+
+    async def attach(self, page):
+        """为页面安装缓存路由, 需要先于RequestRouter安装, 使被拦截的请求不进入缓存"""
+        await page.route('**/*', self.handle)
+
+    async def handle(self, route):
+        request = route.request
+        if not self.is_cacheable(request):
+            await route.fallback()
+            return
+        entry, body = self.get(request.url)
+        if entry is not None:
+            self.hits += 1
+            self.hit_bytes += len(body)
+            # 旧版本的索引没有保存响应头, 只回放content-type
+            headers = entry.get('headers') or {'content-type': entry['content_type']}
+            await route.fulfill(status=200, headers=headers, body=body)
+            return
+        self.misses += 1
+        try:
+            response = await route.fetch()
+            body = await response.body()
+        except Exception:
+            await route.abort('failed')
+            return
+        if response.status == 200:
+            self.put(request.url, body, response.headers.get('content-type', 'application/octet-stream'),
+                     response.headers)
+        await route.fulfill(response=response, body=body)
+
+    def summary(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0
+        return (f'资源缓存: 命中 {self.hits} 次, 未命中 {self.misses} 次, 命中率 {hit_rate:.1%}, '
+                f'节省 {self.hit_bytes / 1024 / 1024:.1f} MB')
@@ -0,0 +1,152 @@
+import math
+import asyncio
+import random
+import itertools
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+from config import config
+
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
+    'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:54.0) Gecko/20100101 Firefox/54.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_12_6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/61.0.3163.100 Safari/537.36'
+]
+
+# 浏览器启动配置
+# desktop: 有界面模式, 便于本地观察
+# server: 无界面模式, 用于服务器批量运行
+BROWSER_PROFILES = {
+    'desktop': {
+        'headless': False,
+        'args': [],
+    },
+    'server': {
+        'headless': True,
+        'args': ['--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu'],
+    },
+}
+
+
+class BrowserPool:
+    """
+    长驻浏览器池, 避免每个链接都冷启动一次Chromium。
+
+    池中有size个槽位, 每个槽位持有一个浏览器、一个上下文和一个页面, 浏览器在第一次租用时启动。
+    worker通过lease()租用页面, 用完归还; 页面使用page_max_uses次后关闭并重新创建,
+    租用期间出现异常的页面也会被回收, 防止脏页面影响后续链接。
+    空闲槽位优先租出已启动浏览器的槽位, 其中最近归还的优先, 实际并发低于size时只有少数槽位会启动浏览器。
+    指定active_limit(返回当前并发数的函数)时, 已启动的浏览器数超过当前并发数, 归还的槽位会关闭浏览器。
+
+    使用示例:
+    ```python
+    async with BrowserPool(size=3) as pool:
+        async with pool.lease() as page:
+            await page.goto(url)
+    ```
+    """
+    def __init__(self, size=None, profile=None, page_max_uses=None, on_new_page=None, active_limit=None):
+        self.size = size or config.parallel_num
+        self.profile = profile or config.crawler_profile
+        if self.profile not in BROWSER_PROFILES:
+            raise ValueError(f'未知的浏览器配置: {self.profile}')
+        self.page_max_uses = page_max_uses or config.crawler_page_max_uses
+        # 新页面创建后的回调, 用于安装请求路由等
+        self.on_new_page = on_new_page
+        self.active_limit = active_limit
+        self.playwright = None
+        self.slots = []
+        self.idle_slots = None
+        # 归还顺序, 用于在同一优先级中先租出最近归还的槽位
+        self.release_order = itertools.count()
+
+    async def start(self):
+        self.playwright = await async_playwright().start()
+        self.idle_slots = asyncio.PriorityQueue()
+        for _ in range(self.size):
+            # 浏览器在槽位第一次被租用时才启动, 并发上限较大时不会一次启动全部浏览器
+            slot = {'browser': None, 'context': None, 'page': None, 'uses': 0}
+            self.slots.append(slot)
+            self._put_idle(slot)
+
+    def _put_idle(self, slot):
+        """已启动浏览器的槽位优先, 同一优先级中最近归还的优先"""
+        self.idle_slots.put_nowait((slot['browser'] is None, -next(self.release_order), slot))
+
+    async def close(self):
+        for slot in self.slots:
+            if slot['browser'] is None:
+                continue
+            try:
+                await slot['browser'].close()
+            except Exception:
+                pass
+        self.slots = []
+        if self.playwright:
+            await self.playwright.stop()
+            self.playwright = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+        return False
+
+    async def _new_page(self, slot):
+        """为槽位创建新的上下文和页面, 每个上下文随机一个User-Agent"""
+        if slot['browser'] is None:
+            slot['browser'] = await self.playwright.chromium.launch(**BROWSER_PROFILES[self.profile])
+        headers = {'User-Agent': random.choice(USER_AGENTS)}
+        slot['context'] = await slot['browser'].new_context(extra_http_headers=headers)
+        slot['page'] = await slot['context'].new_page()
+        slot['uses'] = 0
+        if self.on_new_page is not None:
+            await self.on_new_page(slot['page'])
+
+    async def _recycle(self, slot):
+        """关闭槽位当前的上下文, 下次租用时重新创建"""
+        if slot['context'] is not None:
+            try:
+                await slot['context'].close()
+            except Exception:
+                pass
+        slot['context'] = None
+        slot['page'] = None
+        slot['uses'] = 0
+
+    async def _close_browser(self, slot):
+        await self._recycle(slot)
+        try:
+            await slot['browser'].close()
+        except Exception:
+            pass
+        slot['browser'] = None
+
+    async def _trim(self, slot):
+        """已启动的浏览器数超过当前并发数时, 关闭归还槽位的浏览器"""
+        if self.active_limit is None or slot['browser'] is None:
+            return
+        launched = sum(1 for item in self.slots if item['browser'] is not None)
+        if launched > max(1, math.ceil(self.active_limit())):
+            await self._close_browser(slot)
+
+    @asynccontextmanager
+    async def lease(self):
+        _, _, slot = await self.idle_slots.get()
+        try:
+            if slot['page'] is None or slot['page'].is_closed() or slot['uses'] >= self.page_max_uses:
+                await self._recycle(slot)
+                await self._new_page(slot)
+            slot['uses'] += 1
+            try:
+                yield slot['page']
+            except BaseException:
+                await self._recycle(slot)
+                raise
+        finally:
+            try:
+                await self._trim(slot)
+            finally:
+                self._put_idle(slot)
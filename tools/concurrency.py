@@ -0,0 +1,156 @@
+import time
+import asyncio
+from collections import deque
+from urllib.parse import urlsplit
+from config import config
+
+
+class AdaptiveLimiter:
+    """
+    AIMD并发控制器, 替代固定大小的Semaphore。
+
+    - 加性增长: 每成功一次, limit增加1/limit, 即每轮(limit个请求)全部健康时limit加1。
+      只有平均耗时不超过target_latency且最近的失败率不超过max_error_rate时才增长
+    - 乘性减少: 出现超时或验证页面时, limit乘以backoff_factor。
+      一个冷却期(cooldown秒)内只减少一次, 避免同一批失败请求把limit降到底
+
+    使用示例:
+    ```python
+    limiter = AdaptiveLimiter()
+    async with limiter.slot() as report:
+        ...
+        report.success()  # 或 report.throttled() / report.failure()
+    ```
+    """
+    def __init__(self, initial=None, min_limit=1, max_limit=None, target_latency=None,
+                 max_error_rate=0.2, backoff_factor=0.5, cooldown=10, window=20):
+        self.max_limit = max_limit or config.crawler_max_parallel_num
+        self.min_limit = min_limit
+        self._limit = float(min(max(initial or config.parallel_num, min_limit), self.max_limit))
+        self.target_latency = target_latency or config.crawler_target_latency
+        self.max_error_rate = max_error_rate
+        self.backoff_factor = backoff_factor
+        self.cooldown = cooldown
+        self.outcomes = deque(maxlen=window)
+        self.latency = None
+        self.in_flight = 0
+        self.last_decrease = 0
+        self.condition = asyncio.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def on_success(self, latency):
+        self.outcomes.append(True)
+        # 耗时的指数移动平均
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        if self.latency <= self.target_latency and self.error_rate() <= self.max_error_rate:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+    def on_failure(self):
+        """普通失败(如页面结构异常)只计入失败率, 失败率过高时减少并发"""
+        self.outcomes.append(False)
+        if self.error_rate() > self.max_error_rate:
+            self._decrease()
+
+    def on_throttled(self):
+        """超时或出现验证页面, 说明已经被限流, 立即减少并发"""
+        self.outcomes.append(False)
+        self._decrease()
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self.last_decrease < self.cooldown:
+            return
+        self.last_decrease = now
+        self._limit = max(self.min_limit, self._limit * self.backoff_factor)
+
+    def slot(self):
+        return _LimiterSlot(self)
+
+
+class _LimiterSlot:
+    """占用一个并发名额, 退出时根据report的结果调整limit, 没有report的视为普通失败"""
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.start_time = None
+        self.outcome = None
+
+    def success(self):
+        self.outcome = 'success'
+
+    def failure(self):
+        self.outcome = 'failure'
+
+    def throttled(self):
+        self.outcome = 'throttled'
+
+    async def __aenter__(self):
+        await self.limiter.acquire()
+        self.start_time = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.outcome == 'success':
+            self.limiter.on_success(time.monotonic() - self.start_time)
+        elif self.outcome == 'throttled':
+            self.limiter.on_throttled()
+        else:
+            self.limiter.on_failure()
+        await self.limiter.release()
+        return False
+
+
+class HostRateLimiter:
+    """
+    按域名的令牌桶限速, 每个域名每秒最多rate个请求, 允许burst个突发请求。
+    多进程模式下传入主进程启动的Manager, 令牌桶保存在Manager中, 各子进程共用同一个限速。
+    """
+    def __init__(self, rate=None, burst=None, manager=None):
+        self.rate = rate or config.crawler_host_rate
+        self.burst = burst or config.crawler_host_burst
+        self.buckets = manager.dict() if manager is not None else {}
+        self.lock = manager.Lock() if manager is not None else None
+
+    def _take(self, host):
+        """
+        取一个令牌
+        :return: 需要等待的秒数, 0表示已取得令牌
+        """
+        now = time.monotonic()
+        bucket = self.buckets.get(host) or {'tokens': float(self.burst), 'updated': now}
+        tokens = min(self.burst, bucket['tokens'] + (now - bucket['updated']) * self.rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / self.rate
+        if not wait:
+            tokens -= 1
+        # Manager的字典代理感知不到嵌套字典的修改, 每次整体赋值
+        self.buckets[host] = {'tokens': tokens, 'updated': now}
+        return wait
+
+    async def acquire(self, url):
+        host = urlsplit(url).hostname or ''
+        while True:
+            if self.lock is None:
+                wait = self._take(host)
+            else:
+                with self.lock:
+                    wait = self._take(host)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
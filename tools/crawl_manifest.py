@@ -0,0 +1,216 @@
+import os
+import json
+import hashlib
+import pendulum
+from pathlib import Path
+from tools.wechat_url import normalize_url
+
+
+class CrawlManifest:
+    """
+    文章爬取记录, 以规范化后的链接为键, 记录每个链接的爬取状态、输出文件和内容哈希。
+    重复执行时跳过已完成的链接, 只重试失败和未爬取的链接。
+
+    记录文件为JSONL格式, 每完成一个链接追加一行, 读取时后出现的记录覆盖先出现的记录,
+    因此中途崩溃也不会丢失已完成的结果。load时会对文件进行压缩, 每个链接只保留一行。
+
+    已完成的记录同时按文章的规范链接和"账号+日期+标题"建立索引, 用于在打开文章后发现重复文章,
+    例如同一篇文章的短链接和长链接。
+
+    使用示例:
+    ```python
+    manifest = CrawlManifest(path).load()
+    for url in manifest.pending(urls):
+        ...
+        manifest.mark_done(url, pdf_path)
+    ```
+    """
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.records = {}
+        self.articles = {}
+
+    def load(self, compact=True):
+        """
+        读取记录文件
+        :param compact: 是否压缩记录文件, 只读使用(如多进程模式的子进程)时应为False
+        """
+        self.records = {}
+        self.articles = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 崩溃时最后一行可能写了一半, 忽略即可
+                        continue
+                    # 规范化规则可能变化, 以最新规则重新计算键
+                    record['key'] = normalize_url(record['url'])
+                    self.records[record['key']] = record
+            for record in self.records.values():
+                self._index_article(record)
+            if compact:
+                self.compact()
+        return self
+
+    def compact(self):
+        """重写记录文件, 每个链接只保留最新的一条记录"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self.records.values():
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def _append(self, record):
+        self.records[record['key']] = record
+        self._index_article(record)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def _index_article(self, record):
+        info = record.get('info')
+        if record['status'] != self.STATUS_DONE or not info:
+            return
+        for key in article_keys(info):
+            self.articles[key] = record
+
+    def find_article(self, info):
+        """
+        按文章的规范链接或"账号+日期+标题"查找已完成的记录, 输出文件不存在时视为未完成
+        :param info: 文章信息, 包含canonical_key, account, date, title
+        """
+        for key in article_keys(info):
+            record = self.articles.get(key)
+            if record is not None and record.get('path') and os.path.exists(record['path']):
+                return record
+        return None
+
+    def get(self, url):
+        return self.records.get(normalize_url(url))
+
+    def is_done(self, url):
+        """已完成且输出文件仍然存在的链接才算完成"""
+        record = self.get(url)
+        if record is None or record['status'] != self.STATUS_DONE:
+            return False
+        return record.get('path') is not None and os.path.exists(record['path'])
+
+    def iter_pending(self, urls):
+        """逐个返回需要爬取的链接, 跳过已完成的链接, 并按规范化链接去重"""
+        seen = set()
+        for url in urls:
+            key = normalize_url(url)
+            if key in seen or self.is_done(url):
+                continue
+            seen.add(key)
+            yield url
+
+    def pending(self, urls):
+        """返回需要爬取的链接列表"""
+        return list(self.iter_pending(urls))
+
+    def mark_done(self, url, path, info=None):
+        self._append({
+            'key': normalize_url(url),
+            'url': url,
+            'status': self.STATUS_DONE,
+            'path': str(path),
+            'hash': file_hash(path),
+            'info': info,
+            'error': None,
+            'updated_at': pendulum.now().to_iso8601_string(),
+        })
+
+    def mark_failed(self, url, error):
+        self._append({
+            'key': normalize_url(url),
+            'url': url,
+            'status': self.STATUS_FAILED,
+            'path': None,
+            'hash': None,
+            'info': None,
+            'error': error if isinstance(error, str) else f'{type(error).__name__}: {error}',
+            'updated_at': pendulum.now().to_iso8601_string(),
+        })
+
+
+def article_keys(info):
+    """
+    文章的去重键: 规范链接, 以及账号+日期+标题。
+    输出文件以"日期_标题"命名, 同一账号每天/每周重复使用的标题(如日报、周报)不是同一篇文章
+    """
+    keys = []
+    if info.get('canonical_key'):
+        keys.append(('url', info['canonical_key']))
+    if info.get('account') and info.get('date') and info.get('title'):
+        keys.append(('title', info['account'], info['date'], info['title']))
+    return keys
+
+
+class SharedArticleClaims:
+    """
+    多进程模式下各子进程共用的文章去重键, 保存在主进程启动的Manager中,
+    避免同一篇文章的短链接和长链接被不同的子进程同时保存到同一个文件。
+    值为正在保存的子进程pid, 保存完成后替换为{'url', 'path'}, 保存失败时删除。
+    """
+    def __init__(self, manager):
+        self.claims = manager.dict()
+        self.lock = manager.Lock()
+
+    def try_claim(self, keys):
+        """
+        占用全部去重键
+        :return: None表示占用成功; 已保存时返回{'url', 'path'}; 其它子进程正在保存时返回其pid
+        """
+        pid = os.getpid()
+        with self.lock:
+            for key in keys:
+                holder = self.claims.get(key)
+                # 正在保存的子进程已经退出, 视为保存失败
+                if isinstance(holder, int) and holder != pid and not _pid_alive(holder):
+                    holder = None
+                if holder is not None and holder != pid:
+                    return holder
+            for key in keys:
+                self.claims[key] = pid
+        return None
+
+    def release(self, keys, original):
+        """保存完成(original为{'url', 'path'})或失败(original为None)"""
+        pid = os.getpid()
+        with self.lock:
+            for key in keys:
+                if self.claims.get(key) != pid:
+                    continue
+                if original is None:
+                    self.claims.pop(key, None)
+                else:
+                    self.claims[key] = original
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def file_hash(path):
+    """计算文件内容的sha256"""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
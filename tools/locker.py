@@ -18,11 +18,13 @@ class Locker:
         lock_file.set(data)
         pass
     ```
+    timeout大于0时, 文件被其它进程锁定时最多等待timeout秒, 默认不等待直接抛出BlockingIOError
     """
-    def __init__(self, file_name):
+    def __init__(self, file_name, timeout=0):
         root_path = Path(config.root_dir)
         lock_dir = root_path / 'tmp' / 'locks'
         self.file_name = lock_dir / file_name
+        self.timeout = timeout
         self.file = None
 
     def lock(self):
@@ -34,12 +36,18 @@ class Locker:
         # 切换到r+模式以便后续读写操作
         self.file.close()
         self.file = open(str(self.file_name), 'r+')
-        try:
-            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
-        except BlockingIOError:
-            self.file.close()
-            self.file = None
-            raise
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                if time.monotonic() < deadline:
+                    time.sleep(0.1)
+                    continue
+                self.file.close()
+                self.file = None
+                raise
 
     def release(self):
         if self.file:
@@ -0,0 +1,74 @@
+import time
+import random
+from config import config
+
+
+PACING_MODES = ('fast', 'human')
+
+
+class Pacer:
+    """
+    后台页面操作的等待策略, 替代各处固定的time.sleep(random.uniform(...))。
+
+    - human: 模拟人工操作, 随机等待并随机滚动页面
+    - fast: 不做随机等待和滚动, 只等待元素、网络空闲和下载事件, 适合可信的运行环境
+    - budget: human模式下随机等待的总时长上限(秒), 用完后按fast模式执行, 0表示不限制
+
+    使用示例:
+    ```python
+    pacer = Pacer()
+    page.click('text=数据分析')
+    pacer.pause(0.5, 3, page)  # human模式随机等待, fast模式等待网络空闲
+    ```
+    """
+    def __init__(self, mode=None, budget=None, settle_timeout=5000):
+        self.mode = mode or config.wechat_pacing_mode
+        if self.mode not in PACING_MODES:
+            raise ValueError(f'不支持的等待模式: {self.mode}, 可选: {", ".join(PACING_MODES)}')
+        self.budget = config.wechat_pacing_budget if budget is None else budget
+        self.settle_timeout = settle_timeout
+        self.spent = 0
+
+    @property
+    def human(self):
+        """是否模拟人工操作, 等待预算用完后返回False"""
+        if self.mode != 'human':
+            return False
+        return not self.budget or self.spent < self.budget
+
+    def pause(self, low, high, page=None):
+        """
+        human模式随机等待low至high秒;
+        fast模式下传入page时等待网络空闲(超时不报错), 用于操作后没有可等待元素的场景
+        """
+        if self.human:
+            seconds = random.uniform(low, high)
+            if self.budget:
+                seconds = min(seconds, self.budget - self.spent)
+            self.spent += seconds
+            time.sleep(seconds)
+        elif page is not None:
+            self.settle(page)
+
+    def settle(self, page):
+        try:
+            page.wait_for_load_state('networkidle', timeout=self.settle_timeout)
+        except Exception:
+            # 长连接等原因导致网络一直不空闲时, 不影响后续操作
+            pass
+
+    def scroll(self, page):
+        """human模式随机滚动页面"""
+        if self.human:
+            page.evaluate(f'window.scrollBy(0, {random.randint(100, 500)});')
+
+    def reveal(self, page, element):
+        """
+        使元素可见: human模式逐步滚动页面直到元素可见, fast模式直接滚动到元素
+        """
+        if not self.human:
+            element.scroll_into_view_if_needed()
+            return
+        while not element.is_visible():
+            page.evaluate('window.scrollBy(0, 100);')
+            self.pause(0.5, 0.5)
@@ -0,0 +1,77 @@
+import re
+from config import config
+
+
+# 被拦截请求无法得知真实大小, 按资源类型估算节省的流量(字节)
+ESTIMATED_BYTES = {
+    'media': 500 * 1024,
+    'font': 40 * 1024,
+    'image': 50 * 1024,
+    'script': 30 * 1024,
+    'stylesheet': 20 * 1024,
+    'document': 30 * 1024,
+}
+DEFAULT_ESTIMATED_BYTES = 5 * 1024
+
+
+class RequestRouter:
+    """
+    页面请求路由, 拦截对保存PDF没有影响的请求, 如统计上报、视频播放器、字体、评论和推荐组件。
+
+    拦截规则:
+    1. 页面主文档永远放行
+    2. url匹配allow_url_patterns的请求放行
+    3. 资源类型在block_resource_types中, 或url匹配block_url_patterns的请求拦截
+    4. 其它请求交给后续路由处理(如资源缓存), 没有后续路由则正常请求
+
+    url规则为正则表达式, 使用re.search匹配。
+    每个页面单独统计拦截数量和估算节省的流量, 通过pop_stats获取并清零。
+    """
+    def __init__(self, block_resource_types=None, block_url_patterns=None, allow_url_patterns=None):
+        if block_resource_types is None:
+            block_resource_types = config.crawler_block_resource_types
+        if block_url_patterns is None:
+            block_url_patterns = config.crawler_block_url_patterns
+        if allow_url_patterns is None:
+            allow_url_patterns = config.crawler_allow_url_patterns
+        self.block_resource_types = set(block_resource_types)
+        self.block_url_patterns = [re.compile(pattern) for pattern in block_url_patterns]
+        self.allow_url_patterns = [re.compile(pattern) for pattern in allow_url_patterns]
+        self.stats = {}
+
+    async def attach(self, page):
+        """为页面安装路由, 由浏览器池在创建页面时调用"""
+        self.stats[page] = self._empty_stats()
+        page.on('close', lambda _: self.stats.pop(page, None))
+        await page.route('**/*', lambda route: self.handle(page, route))
+
+    def should_block(self, page, request):
+        if request.is_navigation_request() and request.frame == page.main_frame:
+            return False
+        url = request.url
+        if any(pattern.search(url) for pattern in self.allow_url_patterns):
+            return False
+        if request.resource_type in self.block_resource_types:
+            return True
+        return any(pattern.search(url) for pattern in self.block_url_patterns)
+
+    async def handle(self, page, route):
+        request = route.request
+        if not self.should_block(page, request):
+            await route.fallback()
+            return
+        stats = self.stats.setdefault(page, self._empty_stats())
+        stats['blocked_requests'] += 1
+        stats['saved_bytes'] += ESTIMATED_BYTES.get(request.resource_type, DEFAULT_ESTIMATED_BYTES)
+        stats['blocked_types'][request.resource_type] = stats['blocked_types'].get(request.resource_type, 0) + 1
+        await route.abort('blockedbyclient')
+
+    def pop_stats(self, page):
+        """获取页面自上次调用以来的拦截统计, 并清零"""
+        stats = self.stats.get(page) or self._empty_stats()
+        self.stats[page] = self._empty_stats()
+        return stats
+
+    @staticmethod
+    def _empty_stats():
+        return {'blocked_requests': 0, 'saved_bytes': 0, 'blocked_types': {}}
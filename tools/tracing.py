@@ -0,0 +1,161 @@
+import json
+import time
+import threading
+import functools
+from pathlib import Path
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+"""
+    运行耗时追踪: 记录每个阶段(span)的开始、结束时间, 下载的字节数和生成的数据行数,
+    写入JSONL追踪文件, 运行结束时打印按阶段汇总的耗时表。
+    没有开启追踪时, span不记录任何内容, 可以放心地留在代码中。
+
+    使用示例:
+    ```python
+    tracer = start_trace('tmp/traces/wechat_fetch.jsonl')
+    with span('download_traffic_data') as s:
+        ...
+        s.add(bytes=path.stat().st_size)
+    finish_trace()  # 打印汇总表
+    ```
+"""
+
+_tracer = None
+_local = threading.local()
+
+
+class Span:
+    def __init__(self, name, parent=None, attrs=None):
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs or {}
+        self.bytes = 0
+        self.rows = 0
+        self.start = None
+        self.end = None
+        self.error = None
+
+    def add(self, bytes=0, rows=0):
+        """累加下载的字节数和生成的数据行数"""
+        self.bytes += bytes or 0
+        self.rows += rows or 0
+
+    def add_file(self, path):
+        """累加文件大小, 文件不存在时忽略"""
+        path = Path(path)
+        if path.exists():
+            self.bytes += path.stat().st_size
+
+    @property
+    def duration(self):
+        return (self.end or time.time()) - self.start
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'parent': self.parent,
+            'start': round(self.start, 3),
+            'end': round(self.end, 3),
+            'duration': round(self.duration, 3),
+            'bytes': self.bytes,
+            'rows': self.rows,
+            'attrs': self.attrs,
+            'error': self.error,
+        }
+
+
+class Tracer:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.spans = []
+        self.start = time.time()
+
+    def record(self, span):
+        with self.lock:
+            self.spans.append(span)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + '\n')
+
+    def summary(self):
+        """按阶段名称汇总: 次数, 总耗时, 最大耗时, 字节数, 行数"""
+        stats = defaultdict(lambda: {'count': 0, 'total': 0.0, 'max': 0.0, 'bytes': 0, 'rows': 0, 'errors': 0})
+        for span in self.spans:
+            stat = stats[span.name]
+            stat['count'] += 1
+            stat['total'] += span.duration
+            stat['max'] = max(stat['max'], span.duration)
+            stat['bytes'] += span.bytes
+            stat['rows'] += span.rows
+            stat['errors'] += 1 if span.error else 0
+        return sorted(stats.items(), key=lambda item: item[1]['total'], reverse=True)
+
+    def print_summary(self):
+        print(f'运行耗时 {time.time() - self.start:.1f}s, 追踪文件: {self.path}')
+        print(f"{'阶段':<40}{'次数':>6}{'总耗时(s)':>12}{'最大(s)':>10}{'字节':>12}{'行数':>8}{'失败':>6}")
+        for name, stat in self.summary():
+            print(f"{name:<40}{stat['count']:>6}{stat['total']:>12.2f}{stat['max']:>10.2f}"
+                  f"{stat['bytes']:>12}{stat['rows']:>8}{stat['errors']:>6}")
+
+
+def start_trace(path):
+    """开启追踪, 之后的span写入path"""
+    global _tracer
+    _tracer = Tracer(path)
+    return _tracer
+
+
+def finish_trace():
+    """结束追踪并打印汇总表"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.print_summary()
+    return tracer
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    记录一个阶段, 同一线程中嵌套的span会记录外层span的名称作为parent。
+    没有开启追踪时只返回一个不记录的Span
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    current = Span(name, stack[-1].name if stack else None, attrs)
+    current.start = time.time()
+    stack.append(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = repr(e)
+        raise
+    finally:
+        stack.pop()
+        current.end = time.time()
+        tracer = _tracer
+        if tracer is not None:
+            tracer.record(current)
+
+
+def current_span():
+    """当前线程最内层的span, 没有时返回一个不记录的Span, 用于在函数内部累加字节数和行数"""
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else Span(None)
+
+
+def traced(name=None):
+    """方法装饰器, 用方法名作为span名称"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,86 @@
+import csv
+import json
+from pathlib import Path
+import openpyxl
+
+
+def iter_urls(path, column='文章链接'):
+    """
+    流式读取链接列表, 逐行返回链接, 不会一次性把整个文件读入内存。
+    支持的格式:
+        .xlsx  第一行为表头, 读取column列
+        .csv   第一行为表头, 读取column列
+        .jsonl 每行一个对象, 读取column或url字段; 也可以每行一个字符串
+    文件不存在时抛出FileNotFoundError, 表头中没有column列时抛出KeyError。
+    这两种错误在调用时立即抛出, 读取数据行时才开始逐行迭代。
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f'未找到文件 {path}')
+    suffix = path.suffix.lower()
+    if suffix == '.xlsx':
+        return _iter_xlsx(path, column)
+    if suffix == '.csv':
+        return _iter_csv(path, column)
+    if suffix == '.jsonl':
+        return _iter_jsonl(path, column)
+    raise ValueError(f'不支持的文件格式: {path.suffix}')
+
+
+def _clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _iter_xlsx(path, column):
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    rows = workbook.worksheets[0].iter_rows(values_only=True)
+    header = [_clean(cell) for cell in next(rows, [])]
+    if column not in header:
+        workbook.close()
+        raise KeyError(column)
+    index = header.index(column)
+
+    def generate():
+        try:
+            for row in rows:
+                url = _clean(row[index]) if index < len(row) else None
+                if url:
+                    yield url
+        finally:
+            workbook.close()
+    return generate()
+
+
+def _iter_csv(path, column):
+    file = open(path, 'r', encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(file)
+    if column not in (reader.fieldnames or []):
+        file.close()
+        raise KeyError(column)
+
+    def generate():
+        with file:
+            for row in reader:
+                url = _clean(row.get(column))
+                if url:
+                    yield url
+    return generate()
+
+
+def _iter_jsonl(path, column):
+    def generate():
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                if isinstance(item, dict):
+                    item = item.get(column) or item.get('url')
+                url = _clean(item)
+                if url:
+                    yield url
+    return generate()
@@ -1,5 +1,63 @@
 import pendulum
 import re
+from tools.tracing import span, traced
+
+
+def split_date_range(begin: pendulum.DateTime, end: pendulum.DateTime):
+    """
+    将日期范围拆分为日期选择器可以选择的多个窗口, 每个窗口跨度小于2个月。
+    窗口首尾相接, 不重叠, 按时间顺序返回[(begin, end), ...]
+    """
+    if begin > end:
+        raise ValueError("开始日期不能大于结束日期")
+    windows = []
+    window_begin = begin
+    while window_begin <= end:
+        window_end = min(end, window_begin.add(months=2).subtract(days=1))
+        # 月末日期加减月份时会对齐到月末, 需要确认跨度确实小于2个月
+        while pendulum.Interval(window_begin, window_end).in_months() >= 2:
+            window_end = window_end.subtract(days=1)
+        windows.append((window_begin, window_end))
+        window_begin = window_end.add(days=1)
+    return windows
+
+
+# 日历面板和面板标题
+PANEL_SELECTOR = '//dd[contains(@class, "weui-desktop-picker__dd")]/div[contains(@class, "weui-desktop-picker__panel_day")]'
+PANEL_HEAD_SELECTOR = '//div[contains(@class, "weui-desktop-picker__panel__hd")]'
+
+# 一次读取所有面板标题文字
+PANEL_HEADS_JS = """
+(parent) => Array.from(parent.querySelectorAll('.weui-desktop-picker__panel_day .weui-desktop-picker__panel__hd'))
+    .map(head => head.innerText)
+"""
+
+# 等待指定面板的标题变为目标年月
+PANEL_HEAD_MATCH_JS = """
+([parent, index, year, month]) => {
+    const heads = parent.querySelectorAll('.weui-desktop-picker__panel_day .weui-desktop-picker__panel__hd');
+    const match = heads[index] && heads[index].innerText.match(/(\\d{4})年\\s+(\\d{1,2})月/);
+    return !!match && Number(match[1]) === year && Number(match[2]) === month;
+}
+"""
+
+# 等待日期元素的class变化, 即日期已被选中
+CLASS_CHANGED_JS = "([el, className]) => el.className !== className"
+
+# 等待DOM状态的超时时间(毫秒), 超时后回退到逐月点击的方式
+FAST_PICK_TIMEOUT = 3000
+
+
+def _abstract_year_month(date_str: str):
+    match = re.search(r"(\d{4})年\s+(\d{1,2})月", date_str)
+    if not match:
+        raise ValueError("日历标题日期格式错误")
+    return int(match.group(1)), int(match.group(2))
+
+
+def _month_delta(year, month, date):
+    """从year年month月到date所在月份相差的月数"""
+    return (date.year - year) * 12 + date.month - month
 
 
 def pick_date(begin: pendulum.DateTime, end: pendulum.DateTime, page, parent):
@@ -7,6 +65,7 @@ def pick_date(begin: pendulum.DateTime, end: pendulum.DateTime, page, parent):
     需要确保日期选择器在页面上显示
     微信后台日期选择器，选择特定的日期范围。
     跨度不能超过2个月
+    优先直接翻到目标月份并等待DOM状态确认, 失败时回退到逐月点击的方式
     """
     # 如果end - begin超过 2各月，throw exception
     if begin > end:
@@ -17,12 +76,81 @@ def pick_date(begin: pendulum.DateTime, end: pendulum.DateTime, page, parent):
     if delta.in_months() >= 2:
         raise ValueError("日期选择器超出范围，开始结束时间相差不能超过2个月")
 
-    def _abstract_year_month(date_str: str):
-        match = re.search(r"(\d{4})年\s+(\d{1,2})月", date_str)
-        if not match:
-            raise ValueError("日历标题日期格式错误")
-        return int(match.group(1)), int(match.group(2))
+    with span('pick_date', begin=begin.to_date_string(), end=end.to_date_string()):
+        try:
+            _pick_date_fast(begin, end, page, parent)
+        except Exception as e:
+            print(f"快速选择日期失败, 回退到逐月点击: {e}")
+            # 日期选择器仍处于打开状态时先关闭, 逐月点击的方式会重新打开
+            if any(pannel.is_visible() for pannel in parent.query_selector_all(PANEL_SELECTOR)):
+                parent.query_selector('//span[@class="weui-desktop-picker__icon-wrap"]').click()
+            _pick_date_by_click(begin, end, page, parent)
+
+
+def _pick_date_fast(begin: pendulum.DateTime, end: pendulum.DateTime, page, parent):
+    """
+    一次读取面板标题, 计算需要翻页的次数后连续点击翻页按钮, 只在翻页完成后等待一次标题变为目标年月。
+    每次选择日期后等待日期元素的class变化确认选中, 不使用固定的等待时间。
+    """
+    picker_icon = parent.query_selector('//span[@class="weui-desktop-picker__icon-wrap"]')
+    picker_icon.click()
+    page.wait_for_selector(PANEL_SELECTOR, state='visible', timeout=FAST_PICK_TIMEOUT)
+
+    pannels = parent.query_selector_all(PANEL_SELECTOR)
+    if len(pannels) < 2:
+        raise ValueError("日历面板数量错误")
+    left_pannel, right_pannel, *_ = pannels
+    prev_button = left_pannel.query_selector("button")
+    next_button = right_pannel.query_selector("button")
+
+    def turn_to(index, year, month, date):
+        """翻页直到第index个面板显示date所在月份, 返回翻页后该面板的年月"""
+        months = _month_delta(year, month, date)
+        button = prev_button if months < 0 else next_button
+        for _ in range(abs(months)):
+            button.click()
+        if months:
+            page.wait_for_function(
+                PANEL_HEAD_MATCH_JS, arg=[parent, index, date.year, date.month], timeout=FAST_PICK_TIMEOUT
+            )
+        return date.year, date.month
+
+    def select_day(pannel, day):
+        cell = pannel.query_selector(
+            f'//tbody//*//a[not(contains(@class, "weui-desktop-picker__faded")) and text()={day}]'
+        )
+        if cell is None:
+            raise ValueError(f"未找到日期 {day}")
+        class_name = cell.get_attribute('class') or ''
+        cell.click()
+        page.wait_for_function(CLASS_CHANGED_JS, arg=[cell, class_name], timeout=FAST_PICK_TIMEOUT)
 
+    heads = [_abstract_year_month(text) for text in parent.evaluate(PANEL_HEADS_JS)[:2]]
+    (left_year, left_month), (right_year, right_month) = heads
+
+    # 选择begin: begin不在两个面板中时, 翻页使左侧面板显示begin所在月份
+    if (begin.year, begin.month) not in heads:
+        left_year, left_month = turn_to(0, left_year, left_month, begin)
+        right_first_day = pendulum.date(left_year, left_month, 1).add(months=1)
+        right_year, right_month = right_first_day.year, right_first_day.month
+    select_day(left_pannel if (left_year, left_month) == (begin.year, begin.month) else right_pannel, begin.day)
+
+    # 选择end: end不在两个面板中时, 翻页使右侧面板显示end所在月份
+    if (end.year, end.month) not in ((left_year, left_month), (right_year, right_month)):
+        right_year, right_month = turn_to(1, right_year, right_month, end)
+        left_first_day = pendulum.date(right_year, right_month, 1).subtract(months=1)
+        left_year, left_month = left_first_day.year, left_first_day.month
+    select_day(left_pannel if (left_year, left_month) == (end.year, end.month) else right_pannel, end.day)
+
+    # 关闭picker
+    picker_icon.click()
+
+
+@traced('pick_date_by_click')
+def _pick_date_by_click(begin: pendulum.DateTime, end: pendulum.DateTime, page, parent):
+    """
+    逐月点击翻页按钮, 每次点击后固定等待, 作为快速选择失败时的回退方式
+    """
     # 打开日期选择器
     picker_icon = parent.query_selector(
         '//span[@class="weui-desktop-picker__icon-wrap"]'
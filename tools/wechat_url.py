@@ -0,0 +1,48 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+# 不影响文章内容的跟踪参数
+TRACKING_PARAMS = {
+    'chksm', 'scene', 'subscene', 'ascene', 'srcid', 'sharer_sharetime', 'sharer_shareid', 'sharer_shareinfo',
+    'sharer_shareinfo_first', 'clicktime', 'enterid', 'from', 'isappinstalled', 'devicetype', 'version',
+    'nettype', 'lang', 'exportkey', 'pass_ticket', 'wx_header', 'key', 'uin', 'sessionid', 'poc_token',
+    'mpshare', 'share_source', 'forceh5', 'fontgear', 'session_us', 'abtest_cookie', 'countrycode',
+    'realreporttime', 'acctmode', 'finder_biz_enter_id', 'ranksessionid', 'from_msgid', 'from_itemidx',
+}
+
+
+def normalize_url(url):
+    """
+    规范化文章链接, 作为爬取记录和去重的键。
+    1. 去掉首尾空白和锚点, 统一为https, 域名小写
+    2. 微信长链接(/s?__biz=&mid=&idx=)规范为__biz+mid+idx, 去掉sn和所有跟踪参数
+    3. 微信短链接(/s/xxxx)去掉所有查询参数
+    4. 其它链接去掉跟踪参数, 查询参数按名称排序
+    """
+    url = str(url).strip()
+    parts = urlsplit(url)
+    scheme = 'https' if parts.scheme in ('http', 'https', '') else parts.scheme
+    host = parts.netloc.lower()
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    if host == 'mp.weixin.qq.com':
+        article_id = _wechat_article_id(parts.path, dict(params))
+        if article_id is not None:
+            biz, mid, idx = article_id
+            query = urlencode([('__biz', biz), ('mid', mid), ('idx', idx)])
+            return urlunsplit(('https', host, '/s', query, ''))
+        if parts.path.startswith('/s/'):
+            return urlunsplit(('https', host, parts.path.rstrip('/'), '', ''))
+    query = urlencode(sorted((k, v) for k, v in params if k not in TRACKING_PARAMS))
+    return urlunsplit((scheme, host, parts.path, query, ''))
+
+
+def _wechat_article_id(path, params):
+    """从微信长链接中提取(__biz, mid, idx), 兼容旧版appmsgid/itemidx参数"""
+    if path not in ('/s', '/mp/appmsg/show'):
+        return None
+    biz = params.get('__biz')
+    mid = params.get('mid') or params.get('appmsgid')
+    idx = params.get('idx') or params.get('itemidx')
+    if not (biz and mid and idx):
+        return None
+    return biz, mid, idx